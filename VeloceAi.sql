@@ -1,6 +1,16 @@
 CREATE DATABASE IF NOT EXISTS `veloce_ai`;
 USE `veloce_ai`;
 
+DROP TABLE IF EXISTS `conversation_messages`;
+CREATE TABLE `conversation_messages` (
+  `session_id` char(32) NOT NULL,
+  `seq` int NOT NULL,
+  `role` varchar(16) NOT NULL,
+  `content` json NOT NULL,
+  `created_at` datetime(6) NOT NULL,
+  PRIMARY KEY (`session_id`,`seq`)
+);
+
 DROP TABLE IF EXISTS `emergency_contacts`;
 CREATE TABLE `emergency_contacts` (
   `id` int NOT NULL AUTO_INCREMENT,
@@ -21,7 +31,7 @@ CREATE TABLE `maintenance_records` (
   `mileage` float DEFAULT NULL,
   `description` text,
   PRIMARY KEY (`id`),
-  KEY `vehicle_id` (`vehicle_id`),
+  KEY `idx_maintenance_vehicle_date` (`vehicle_id`,`service_date`),
   CONSTRAINT `maintenance_records_ibfk_1` FOREIGN KEY (`vehicle_id`) REFERENCES `vehicles` (`id`)
 );
 
@@ -33,13 +43,52 @@ CREATE TABLE `police_stations` (
   `phone_number` varchar(15) NOT NULL,
   `latitude` decimal(10,8) NOT NULL,
   `longitude` decimal(11,8) NOT NULL,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  KEY `idx_police_stations_lat_lon` (`latitude`,`longitude`)
 );
 
 INSERT INTO `police_stations` VALUES 
 (1,'Patia Police Station','Patia Square, Bhubaneswar','+917008719907',20.35182900,85.82493600),
 (2,'Chandrasekharpur Police Station','Chandrasekharpur, Bhubaneswar','+917008719907',20.34324200,85.81987300);
 
+DROP TABLE IF EXISTS `telemetry_readings`;
+CREATE TABLE `telemetry_readings` (
+  `vehicle_id` int NOT NULL,
+  `recorded_at` datetime(3) NOT NULL,
+  `metric` varchar(32) NOT NULL,
+  `value` double NOT NULL,
+  PRIMARY KEY (`vehicle_id`,`metric`,`recorded_at`)
+)
+PARTITION BY RANGE COLUMNS(`recorded_at`)
+(PARTITION p_future VALUES LESS THAN (MAXVALUE));
+
+DROP TABLE IF EXISTS `telemetry_rollups`;
+CREATE TABLE `telemetry_rollups` (
+  `vehicle_id` int NOT NULL,
+  `metric` varchar(32) NOT NULL,
+  `granularity` enum('minute','hour') NOT NULL,
+  `bucket_start` datetime NOT NULL,
+  `sample_count` int NOT NULL,
+  `value_sum` double NOT NULL,
+  `value_min` double NOT NULL,
+  `value_max` double NOT NULL,
+  `value_last` double NOT NULL,
+  `last_at` datetime(3) NOT NULL,
+  PRIMARY KEY (`vehicle_id`,`metric`,`granularity`,`bucket_start`)
+);
+
+DROP TABLE IF EXISTS `vehicle_service_due`;
+CREATE TABLE `vehicle_service_due` (
+  `vehicle_id` int NOT NULL,
+  `service_kind` varchar(32) NOT NULL,
+  `last_service_date` date NOT NULL,
+  `last_service_mileage` float DEFAULT NULL,
+  `next_due_date` date NOT NULL,
+  `next_due_mileage` float DEFAULT NULL,
+  PRIMARY KEY (`vehicle_id`,`service_kind`),
+  CONSTRAINT `vehicle_service_due_ibfk_1` FOREIGN KEY (`vehicle_id`) REFERENCES `vehicles` (`id`)
+);
+
 DROP TABLE IF EXISTS `vehicles`;
 CREATE TABLE `vehicles` (
   `id` int NOT NULL AUTO_INCREMENT,
@@ -51,9 +100,14 @@ CREATE TABLE `vehicles` (
   `tire_pressure` json DEFAULT NULL,
   `engine_oil_life` float DEFAULT NULL,
   `last_service_date` date DEFAULT NULL,
-  PRIMARY KEY (`id`)
+  `updated_at` datetime(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+  PRIMARY KEY (`id`),
+  KEY `idx_vehicles_updated_at` (`updated_at`),
+  KEY `idx_vehicles_vin` (`vin`),
+  KEY `idx_vehicles_model_year` (`model`,`year`),
+  KEY `idx_vehicles_year` (`year`)
 );
 
-INSERT INTO `vehicles` VALUES 
+INSERT INTO `vehicles` (`id`,`model`,`year`,`vin`,`current_mileage`,`battery_level`,`tire_pressure`,`engine_oil_life`,`last_service_date`) VALUES 
 (1,'ID.4',2024,'WVGZZZE2ZMP123456',15000.5,85.5,'{\"FL\": 32, \"FR\": 32, \"RL\": 32, \"RR\": 32}',75,'2024-01-15'),
 (2,'Golf GTI',2023,'WVWZZZ1KZNW987654',22000,NULL,'{\"FL\": 35, \"FR\": 35, \"RL\": 35, \"RR\": 34}',45,'2023-12-01');
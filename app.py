@@ -1,52 +1,83 @@
 import streamlit as st
-from database.db_setup import initialize_database, create_database_connection
-from utils.audio import AudioManager
-from utils.weather import WeatherService
-from groq import Groq
+from database.db_setup import initialize_database
+from database.conversation_store import Conversation, get_conversation_store, is_valid_session_id
+from database.telemetry import get_telemetry_store
+from database.vehicle_repository import get_vehicle_repository
+from database.maintenance import get_maintenance_repository
 import os
 from dotenv import load_dotenv
 import json
-import plotly.graph_objects as go
 import logging
-import base64
-from PIL import Image
+import threading
+import uuid
 import requests
 from datetime import datetime
-from streamlit_javascript import st_javascript
-import geocoder
 from utils.vehicle_controller import VehicleController
-from utils.music import MusicManager
-from utils.sos_manager import SOSManager
-from utils.google_search import GoogleSearchClient
+from utils.cache import get_cache
+from utils.metrics import usage
+from utils.intent_router import classify_intent, text_after_keyword
+from utils.status_answers import answer_status_query
+from utils.response_cache import is_standalone, response_cache, response_fingerprint
+from utils.context_window import ContextWindow
+from utils.images import image_store, image_ref, resolve_image_ref
+from utils.context_assembly import assemble_context
+from utils.services import services
 
 # Load environment variables and setup logging
 load_dotenv()
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize services
-audio_manager = AudioManager()
-weather_service = WeatherService()
-groq_client = Groq()
-music_manager = MusicManager()
-sos_manager = SOSManager(create_database_connection())
+# Services (audio, weather, groq, music, sos, google_search) are imported and
+# built on first use by utils.services and shared across sessions
+
+# Shared lookup caches (live in utils.cache so they survive script reruns)
+ERROR_REPLY = "I apologize, but I encountered an error processing your request. Please try again."
+
+location_cache = get_cache("location", ttl=300, max_size=16, stale_ttl=3600)
+geocode_cache = get_cache("reverse_geocode", ttl=86400, max_size=1024, stale_ttl=7 * 86400)
+
+def _prewarm_speech():
+    try:
+        services.get("audio").prewarm_speech(VehicleController.RESPONSES)
+    except Exception as e:
+        logger.error(f"Error pre-warming speech cache: {str(e)}")
 
 def initialize_session_state():
     """Initialize all session state variables"""
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
+    if 'conversation' not in st.session_state:
+        # The session id lives in the URL so history survives reloads and restarts
+        session_id = st.query_params.get("session")
+        if not is_valid_session_id(session_id):
+            session_id = uuid.uuid4().hex
+            st.query_params["session"] = session_id
+        st.session_state.conversation = Conversation(get_conversation_store(), session_id)
+        
+    if 'system_prompt' not in st.session_state:
+        st.session_state.system_prompt = None
         
     if 'current_image' not in st.session_state:
         st.session_state.current_image = None
         
-    if 'google_search' not in st.session_state:
-        st.session_state.google_search = GoogleSearchClient()
-        
     if 'vehicle_controller' not in st.session_state:
         st.session_state.vehicle_controller = VehicleController()
+        # Command confirmations then play from the speech cache without a TTS call
+        threading.Thread(target=_prewarm_speech, daemon=True).start()
+        
+    if 'context_window' not in st.session_state:
+        st.session_state.context_window = ContextWindow()
+
+    if 'vehicle' not in st.session_state:
+        st.session_state.vehicle = None
+        st.session_state.weather = None
+        st.session_state.city = None
 
 def get_current_location():
     """Get the user's current location based on IP address."""
+    return location_cache.get_or_load('me', _lookup_current_location)
+
+def _lookup_current_location():
+    import geocoder
     g = geocoder.ip('me')
     if g.ok:
         return {
@@ -58,6 +89,11 @@ def get_current_location():
 
 def reverse_geocode(latitude, longitude):
     """Get the city name from latitude and longitude using reverse geocoding."""
+    # ~1km grid so small jitter in the IP fix reuses the same lookup
+    key = (round(float(latitude), 2), round(float(longitude), 2))
+    return geocode_cache.get_or_load(key, lambda: _lookup_city(latitude, longitude))
+
+def _lookup_city(latitude, longitude):
     url = 'https://nominatim.openstreetmap.org/reverse'
     params = {
         'format': 'json',
@@ -95,34 +131,81 @@ def reverse_geocode(latitude, longitude):
         logger.error(f"Error in reverse geocoding: {str(e)}")
         return None
 
-def encode_image(image_bytes):
-    return base64.b64encode(image_bytes).decode('utf-8')
-
 # In app.py, replace both initialize_session_state() functions with:
 
 def initialize_session_state():
     """Initialize all session state variables"""
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
+    if 'conversation' not in st.session_state:
+        # The session id lives in the URL so history survives reloads and restarts
+        session_id = st.query_params.get("session")
+        if not is_valid_session_id(session_id):
+            session_id = uuid.uuid4().hex
+            st.query_params["session"] = session_id
+        st.session_state.conversation = Conversation(get_conversation_store(), session_id)
+        
+    if 'system_prompt' not in st.session_state:
+        st.session_state.system_prompt = None
         
     if 'current_image' not in st.session_state:
         st.session_state.current_image = None
         
-    if 'google_search' not in st.session_state:
-        st.session_state.google_search = GoogleSearchClient()
-        
     if 'vehicle_controller' not in st.session_state:
         st.session_state.vehicle_controller = VehicleController()
+        # Command confirmations then play from the speech cache without a TTS call
+        threading.Thread(target=_prewarm_speech, daemon=True).start()
+        
+    if 'context_window' not in st.session_state:
+        st.session_state.context_window = ContextWindow()
+
+    if 'vehicle' not in st.session_state:
+        st.session_state.vehicle = None
+        st.session_state.weather = None
+        st.session_state.city = None
+
+def vehicle_picker(page_size=25):
+    """Sidebar search over VIN, model and year with keyset paging; returns the chosen id"""
+    query = st.sidebar.text_input("Search by VIN, model or year", key="vehicle_query")
+    # Cursors of the pages visited for this query, so "Previous" can go back
+    if st.session_state.get('vehicle_query_paged') != query:
+        st.session_state.vehicle_query_paged = query
+        st.session_state.vehicle_page_cursors = [None]
+    cursors = st.session_state.vehicle_page_cursors
+
+    try:
+        vehicles, next_cursor = get_vehicle_repository().search(query, cursors[-1], page_size)
+    except Exception as e:
+        logger.error(f"Error searching vehicles: {str(e)}")
+        st.sidebar.error("Couldn't load vehicles. Please try again.")
+        return None
+    if not vehicles:
+        st.sidebar.info("No vehicles match your search.")
+        return None
+
+    selected = st.sidebar.selectbox(
+        "Select Your Vehicle",
+        options=vehicles,
+        format_func=lambda v: f"{v[2]} {v[1]} · {v[3]}"
+    )
+
+    col_prev, col_next = st.sidebar.columns(2)
+    if len(cursors) > 1 and col_prev.button("◀ Previous"):
+        cursors.pop()
+        st.experimental_rerun()
+    if next_cursor is not None and col_next.button("Next ▶"):
+        cursors.append(next_cursor)
+        st.experimental_rerun()
+    return selected[0]
 
 def display_vehicle_status(vehicle_data):
     col1, col2 = st.columns(2)
     
     with col1:
-        st.metric("Battery Level", f"{vehicle_data['battery_level']}%")
-        st.metric("Engine Oil Life", f"{vehicle_data['engine_oil_life']}%")
+        st.metric("Battery Level", f"{vehicle_data.battery_level}%")
+        st.metric("Engine Oil Life", f"{vehicle_data.engine_oil_life}%")
         
     with col2:
-        tire_pressure = json.loads(vehicle_data['tire_pressure'])
+        import plotly.graph_objects as go
+        tire_pressure = vehicle_data.tire_pressure
         fig = go.Figure(data=[go.Scatter(
             x=['FL', 'FR', 'RL', 'RR'],
             y=[tire_pressure['FL'], tire_pressure['FR'], 
@@ -132,7 +215,70 @@ def display_vehicle_status(vehicle_data):
         fig.update_layout(title="Tire Pressure (PSI)")
         st.plotly_chart(fig)
 
-def process_ai_response(messages):
+    display_vehicle_trends(vehicle_data.id)
+
+def display_vehicle_trends(vehicle_id, days=7):
+    """Battery and oil life history, read from the hourly telemetry rollups"""
+    try:
+        telemetry = get_telemetry_store()
+        series = {metric: telemetry.recent_history(vehicle_id, metric, days)
+                  for metric in ('battery_level', 'engine_oil_life')}
+    except Exception as e:
+        logger.error(f"Error loading telemetry history: {str(e)}")
+        return
+    if not any(series.values()):
+        return
+
+    import plotly.graph_objects as go
+    with st.expander(f"Trends (last {days} days)"):
+        fig = go.Figure()
+        for metric, rows in series.items():
+            fig.add_trace(go.Scatter(
+                x=[row[0] for row in rows],
+                y=[row[1] for row in rows],
+                mode='lines',
+                name=metric.replace('_', ' ').title()
+            ))
+        fig.update_layout(yaxis_title="%")
+        st.plotly_chart(fig)
+
+def build_request_messages():
+    """System prompt plus the conversation as role/content dicts"""
+    messages = st.session_state.conversation.as_dicts()
+    if st.session_state.system_prompt:
+        messages.insert(0, {"role": "system", "content": st.session_state.system_prompt})
+    return messages
+
+def stream_completion(model, messages, on_complete=None):
+    """Yield response tokens as they arrive (retried and hedged by the llm service).
+
+    on_complete gets the full answer only if the stream finished cleanly.
+    """
+    parts = []
+    try:
+        for token in services.get("llm").stream(model, messages, temperature=0.7, max_tokens=1024):
+            parts.append(token)
+            yield token
+    except Exception as e:
+        logger.error(f"Error streaming response: {str(e)}")
+        yield ERROR_REPLY
+        return
+    if on_complete:
+        on_complete("".join(parts))
+
+def render_response(response):
+    """Write a response into the current chat bubble and return its final text"""
+    if isinstance(response, str):
+        st.write(response)
+        return response
+    return st.write_stream(response)
+
+def process_ai_response(messages, stream=False):
+    """Answer the last user message.
+
+    Command handlers always return a string. LLM answers are returned as a
+    token generator when ``stream`` is True, otherwise as the full text.
+    """
     # Extract the last user message 
     last_message = messages[-1]["content"]
     last_text = ""
@@ -146,13 +292,14 @@ def process_ai_response(messages):
     
     logger.debug(f"Extracted text: {last_text}")
     text = last_text.lower()
+    intent = classify_intent(text)
+    logger.debug(f"Routed to intent: {intent}")
     
     # Emergency SOS check
-    sos_triggers = ["sos", "emergency", "help", "call police", "danger", "accident"]
-    if any(trigger in text for trigger in sos_triggers):
+    if intent.intent == "sos":
         user_location = get_current_location()
         if user_location:
-            sos_result = sos_manager.handle_sos_request(
+            sos_result = services.get("sos").handle_sos_request(
                 user_location['latitude'],
                 user_location['longitude'],
                 situation=last_text
@@ -166,37 +313,50 @@ def process_ai_response(messages):
                 f"- Station Address: {nearest_station['address']}"
             )
     
+    # Status questions are answered from the loaded vehicle without an LLM call
+    status_answer = answer_status_query(text, st.session_state.vehicle)
+    if status_answer:
+        return status_answer
+
     # Vehicle controls
-    if any(word in text for word in ["light", "lights"]):
+    if intent.intent == "lights":
         return st.session_state.vehicle_controller.control_lights(text)
     
-    if any(word in text for word in ["lock", "unlock", "door"]):
+    if intent.intent == "doors":
         return st.session_state.vehicle_controller.control_doors(text)
     
-    if any(word in text for word in ["engine", "start", "stop"]):
+    if intent.intent == "engine":
         return st.session_state.vehicle_controller.control_engine(text)
     
     # Music commands
-    if any(word in text for word in ["play", "music", "song"]):
+    if intent.intent == "music":
         logger.info("Music command detected")
         query = text
-        if "play" in query:
-            query = query.split("play", 1)[1].strip()
+        if "play" in intent.keywords:
+            query = text_after_keyword(query, "play")
         
+        music = services.get("music")
+        if 'music_up_next' not in st.session_state:
+            st.session_state.music_up_next = music.new_queue()
+        if query.lower().strip(" .!?") in music.NEXT_TRACK_COMMANDS:
+            song_url = music.next_song_url(st.session_state.music_up_next)
+            if song_url and music.play_music(song_url):
+                return "🎵 Playing the next song"
+            return "There's nothing queued up next yet. Ask me to play a song first"
+
         logger.info(f"Searching for song: {query}")
-        song_url = music_manager.search_song(query)
+        song_url = music.search_song(query, st.session_state.music_up_next)
         if song_url:
             logger.info(f"Found song URL: {song_url}")
-            if music_manager.play_music(song_url):
+            if music.play_music(song_url):
                 return f"🎵 Now playing: {query}"
             return f"Found the song but couldn't play {query}"
         return f"Sorry, I couldn't find '{query}' on YouTube Music"
 
     # Google Search integration for general knowledge queries
-    info_keywords = ['who is', 'what is', 'current', 'latest', 'news about', 'tell me about']
-    if any(keyword in text.lower() for keyword in info_keywords):
+    if intent.intent == "info":
         logger.info("General knowledge query detected - searching Google")
-        search_results = st.session_state.google_search.search(text)
+        search_results = services.get("google_search").search(text)
         
         if search_results:
             # Add search context to messages
@@ -208,28 +368,44 @@ def process_ai_response(messages):
                 "content": f"Here is current information from Google Search: {search_context}"
             })
 
+    # Repeated general questions reuse an answer given for the same vehicle, weather and city.
+    # Follow-ups depend on the turns before them, so they always go to the model.
+    cache_key = None
+    if intent.intent == "chat" and not st.session_state.current_image and is_standalone(last_text):
+        vehicle = st.session_state.vehicle
+        city = st.session_state.city
+        fingerprint = response_fingerprint(vehicle, st.session_state.weather, city)
+        # Sessions on the same vehicle in different cities don't invalidate each other
+        scope = (vehicle.id if vehicle else None, (city or "").lower())
+        cache_key = (last_text, fingerprint, scope)
+        cached_answer = response_cache.get(*cache_key)
+        if cached_answer:
+            logger.info("Answered from the response cache")
+            return cached_answer
+
     # Image processing
     if st.session_state.current_image:
         messages_without_system = [msg for msg in messages if msg["role"] != "system"]
         clean_messages = []
         for msg in messages_without_system:
             if isinstance(msg["content"], list):
-                filtered_content = [c for c in msg["content"] if c["type"] == "text" or 
-                                  (c["type"] == "image_url" and 
-                                   c["image_url"]["url"].endswith(st.session_state.current_image))]
+                # Only the current image is sent; its data URL is built here, per request
+                filtered_content = []
+                for c in msg["content"]:
+                    if c["type"] == "text":
+                        filtered_content.append(c)
+                    elif (c["type"] == "image_ref" and
+                          c["image_hash"] == st.session_state.current_image):
+                        image_part = resolve_image_ref(c)
+                        if image_part:
+                            filtered_content.append(image_part)
                 if filtered_content:
-                    msg["content"] = filtered_content
-                    clean_messages.append(msg)
+                    clean_messages.append({"role": msg["role"], "content": filtered_content})
             else:
                 clean_messages.append(msg)
                 
         model = "llama-3.2-11b-vision-preview"
-        response = groq_client.chat.completions.create(
-            model=model,
-            messages=clean_messages,
-            temperature=0.7,
-            max_tokens=1024
-        )
+        request_messages = clean_messages
     else:
         # Text-only mode
         text_only_messages = []
@@ -242,20 +418,35 @@ def process_ai_response(messages):
                 text_only_messages.append(msg)
                 
         model = "llama3-70b-8192"
-        response = groq_client.chat.completions.create(
-            model=model,
-            messages=text_only_messages,
+        request_messages = text_only_messages
+
+    # Keep the prompt within the model's context budget
+    request_messages, prompt_tokens = st.session_state.context_window.build(request_messages)
+    usage.observe(f"llm.{model}.prompt_tokens", prompt_tokens)
+    logger.info(f"Sending {prompt_tokens} prompt tokens to {model}")
+
+    if stream:
+        store = None
+        if cache_key:
+            question, fingerprint, scope = cache_key
+            store = lambda answer: response_cache.put(question, fingerprint, answer, scope)
+        return stream_completion(model, request_messages, on_complete=store)
+
+    try:
+        ai_response = services.get("llm").complete(
+            model,
+            request_messages,
             temperature=0.7,
             max_tokens=1024
         )
-
-    try:
-        ai_response = response.choices[0].message.content
         logger.debug(f"AI Response: {ai_response}")
+        if cache_key:
+            question, fingerprint, scope = cache_key
+            response_cache.put(question, fingerprint, ai_response, scope)
         return ai_response
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
-        return "I apologize, but I encountered an error processing your request. Please try again."
+        return ERROR_REPLY
 
 def main():
     st.set_page_config(page_title="Veloce AI - Volkswagen Assistant",
@@ -268,19 +459,7 @@ def main():
     
     # Sidebar
     st.sidebar.title("Vehicle Selection")
-    conn = create_database_connection()
-    cursor = conn.cursor(dictionary=True)
-    # Option 1: Include 'vin' in the selection query
-    # cursor.execute("SELECT id, model, year, vin FROM vehicles")
-    # Option 2: Keep the original query
-    cursor.execute("SELECT id, model, year FROM vehicles")
-    vehicles = cursor.fetchall()
-    
-    selected_vehicle = st.sidebar.selectbox(
-        "Select Your Vehicle",
-        options=vehicles,
-        format_func=lambda x: f"{x['year']} {x['model']}"
-    )
+    selected_vehicle_id = vehicle_picker()
     
     # Image upload section
     st.sidebar.markdown("### Image Upload")
@@ -288,9 +467,13 @@ def main():
                                           type=['png', 'jpg', 'jpeg'])
     
     if uploaded_file:
-        image = Image.open(uploaded_file)
-        st.sidebar.image(image, caption="Uploaded Image", use_column_width=True)
-        st.session_state.current_image = encode_image(uploaded_file.getvalue())
+        try:
+            st.session_state.current_image = image_store.ingest(uploaded_file.getvalue())
+            st.sidebar.image(image_store.get_bytes(st.session_state.current_image),
+                             caption="Uploaded Image", use_column_width=True)
+        except Exception as e:
+            logger.error(f"Error processing uploaded image: {str(e)}")
+            st.sidebar.error("Couldn't read that image. Please try another file.")
     
     if 'vehicle_controller' not in st.session_state:
         st.session_state.vehicle_controller = VehicleController()
@@ -298,21 +481,31 @@ def main():
     if st.session_state.current_image and st.sidebar.button("Clear Image"):
         st.session_state.current_image = None
         # Clean up message history
-        text_only_messages = []
-        for msg in st.session_state.messages:
-            if isinstance(msg["content"], list):
-                text_content = " ".join([c["text"] for c in msg["content"] if c["type"] == "text"])
-                if text_content:
-                    text_only_messages.append({"role": msg["role"], "content": text_content})
-            else:
-                text_only_messages.append(msg)
-        st.session_state.messages = text_only_messages
+        conversation = st.session_state.conversation
+        for msg in conversation.messages:
+            if isinstance(msg.content, list):
+                conversation.set_content(msg, " ".join([c["text"] for c in msg.content if c["type"] == "text"]))
         st.experimental_rerun()
     
-    if selected_vehicle:
-        cursor.execute("SELECT * FROM vehicles WHERE id = %s", 
-                      (selected_vehicle['id'],))
-        vehicle_data = cursor.fetchone()
+    vehicle_data = None
+    if selected_vehicle_id:
+        # Vehicle row and location -> city -> weather are fetched concurrently
+        context = assemble_context(
+            lambda: get_vehicle_repository().get(selected_vehicle_id),
+            get_current_location,
+            reverse_geocode,
+            services.get("weather").get_weather
+        )
+        vehicle_data = context['vehicle']
+        st.session_state.vehicle = vehicle_data
+        if vehicle_data is None:
+            st.error("Couldn't load data for this vehicle. Please try again.")
+    
+    if vehicle_data:
+        try:
+            get_telemetry_store().record_snapshot(vehicle_data)
+        except Exception as e:
+            logger.error(f"Error recording telemetry: {str(e)}")
         display_vehicle_status(vehicle_data)
         
         # Add SOS Button here
@@ -321,7 +514,7 @@ def main():
             if st.button("🚨 SOS EMERGENCY"):
                 user_location = get_current_location()
                 if user_location:
-                    sos_result = sos_manager.handle_sos_request(
+                    sos_result = services.get("sos").handle_sos_request(
                         user_location['latitude'],
                         user_location['longitude'],
                         situation="Emergency SOS button activated!"
@@ -336,45 +529,42 @@ def main():
                     )
         
         # Fetch necessary variables for system prompt
-        current_vehicle_id = vehicle_data['id']
-        vehicle_model = vehicle_data['model']
-        vehicle_year = vehicle_data['year']
-        vehicle_vin = vehicle_data['vin']  # Get 'vin' from 'vehicle_data'
-        mileage = vehicle_data['current_mileage']
-        battery_percentage = vehicle_data['battery_level']
-        tire_pressure = json.loads(vehicle_data['tire_pressure'])
+        current_vehicle_id = vehicle_data.id
+        vehicle_model = vehicle_data.model
+        vehicle_year = vehicle_data.year
+        vehicle_vin = vehicle_data.vin
+        mileage = vehicle_data.current_mileage
+        battery_percentage = vehicle_data.battery_level
+        tire_pressure = vehicle_data.tire_pressure
         front_left_psi = tire_pressure['FL']
         front_right_psi = tire_pressure['FR']
         rear_left_psi = tire_pressure['RL']
         rear_right_psi = tire_pressure['RR']
-        oil_life_percentage = vehicle_data['engine_oil_life']
-        service_date = vehicle_data['last_service_date']
+        oil_life_percentage = vehicle_data.engine_oil_life
+        service_date = vehicle_data.last_service_date
+        try:
+            telemetry_trends = json.dumps(get_telemetry_store().trend_summary(current_vehicle_id))
+        except Exception as e:
+            logger.error(f"Error loading telemetry trends: {str(e)}")
+            telemetry_trends = "{}"
+        try:
+            maintenance = get_maintenance_repository()
+            recent_services = json.dumps([r.to_dict() for r in maintenance.recent_records(current_vehicle_id)])
+            service_due = json.dumps([d.to_dict() for d in maintenance.service_due(current_vehicle_id)])
+        except Exception as e:
+            logger.error(f"Error loading maintenance history: {str(e)}")
+            recent_services = service_due = "[]"
 
-        # Get user's current location
-        user_location = get_current_location()
-        if user_location:
-            latitude = user_location['latitude']
-            longitude = user_location['longitude'] 
-            current_location = f"{latitude}, {longitude}"
-            current_city = reverse_geocode(latitude, longitude)
-            if current_city:
-                current_city = current_city.split()[0]  # Take only first word
-        else:
-            current_location = "Unknown"
-            current_city = "Unknown"
-        
-        # Get weather data
-        weather_data = weather_service.get_weather(current_city)
-        if weather_data:
-            current_temp = weather_data['temperature']
-            humidity_percentage = weather_data['humidity']
-            weather_description = weather_data['description']
-            wind_speed = weather_data['wind_speed']
-        else:
-            current_temp = 0
-            humidity_percentage = 0
-            weather_description = "Unknown"
-            wind_speed = 0
+        # Location and weather (already fetched, with "Unknown" fallbacks)
+        current_location = context['current_location']
+        current_city = context['current_city']
+        weather_data = context['weather']
+        st.session_state.city = current_city
+        st.session_state.weather = weather_data
+        current_temp = weather_data['temperature']
+        humidity_percentage = weather_data['humidity']
+        weather_description = weather_data['description']
+        wind_speed = weather_data['wind_speed']
         
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
@@ -396,7 +586,12 @@ CONTEXT_VARIABLES = {{
             "RR": {rear_right_psi}
         }},
         "engine_oil_life": {oil_life_percentage},
-        "last_service_date": "{service_date}"
+        "last_service_date": "{service_date}",
+        "telemetry_trends_7d": {telemetry_trends}
+    }},
+    "maintenance": {{
+        "recent_services": {recent_services},
+        "service_due": {service_due}
     }},
     "weather_data": {{
         "city": "{current_city}",
@@ -434,7 +629,7 @@ CAPABILITIES:
    - Access location data for navigation assistance(Just say the city name not the coordinates)
 
 3. Maintenance:
-   - Query maintenance_records table for service history
+   - Use CONTEXT_VARIABLES['maintenance'] for the last services and upcoming due dates/mileage
    - Schedule and recommend maintenance based on vehicle data
    - Alert on critical maintenance needs
 
@@ -480,65 +675,58 @@ RESPONSE GUIDELINES:
 
 If asked about non-VW vehicles, politely redirect to VW equivalents."""
 
-        # Update the system prompt in the message history
-        st.session_state.messages = [
-            {"role": "system", "content": SYSTEM_PROMPT}
-        ] + [msg for msg in st.session_state.messages if msg["role"] != "system"]
+        # Update the system prompt sent with each request
+        st.session_state.system_prompt = SYSTEM_PROMPT
     
-    # Chat interface
-    for message in st.session_state.messages:
-        if message["role"] != "system":
-            with st.chat_message(message["role"]):
-                if isinstance(message["content"], list):
-                    for content in message["content"]:
-                        if content["type"] == "text":
-                            st.write(content["text"])
-                        elif content["type"] == "image_url":
-                            st.image(content["image_url"]["url"])
-                else:
-                    st.write(message["content"])
+    # Chat interface (only the most recent window is rendered)
+    conversation = st.session_state.conversation
+    if conversation.has_earlier() and st.button("Load earlier messages"):
+        conversation.load_earlier()
+    for message in conversation.recent():
+        with st.chat_message(message.role):
+            if isinstance(message.content, list):
+                for content in message.content:
+                    if content["type"] == "text":
+                        st.write(content["text"])
+                    elif content["type"] == "image_ref":
+                        image_bytes = image_store.get_bytes(content["image_hash"])
+                        if image_bytes:
+                            st.image(image_bytes)
+            else:
+                st.write(message.content)
     
     # Voice input button
     if st.button("🎤 Voice Input"):
+        audio_manager = services.get("audio")
+        # Stop the previous answer so it isn't picked up by the microphone
+        audio_manager.stop_speech()
         try:
             with st.spinner("Listening..."):
                 logger.info("Starting voice recording process")
-                recording, sample_rate = audio_manager.record_audio()
-                logger.info(f"Recording completed, sample rate: {sample_rate}")
-                
-                audio_file = audio_manager.save_audio(recording, sample_rate)
-                logger.info(f"Audio saved to file: {audio_file}")
-                
-                user_input = audio_manager.speech_to_text(audio_file)
+                interim = st.empty()
+                # Chunks are transcribed while the driver is still talking
+                user_input = audio_manager.listen_and_transcribe(
+                    on_partial=lambda text: interim.markdown(f"*{text}…*")
+                )
+                interim.empty()
                 logger.info(f"Transcribed text: {user_input}")
                 
                 if user_input:
                     message_content = [{"type": "text", "text": user_input}]
                     if st.session_state.current_image:
-                        message_content.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{st.session_state.current_image}"
-                            }
-                        })
+                        message_content.append(image_ref(st.session_state.current_image))
                     
-                    st.session_state.messages.append({
-                        "role": "user", 
-                        "content": message_content
-                    })
+                    conversation.add("user", message_content)
                     
                     with st.chat_message("assistant"):
                         with st.spinner("Thinking..."):
                             assistant_response = process_ai_response(
-                                st.session_state.messages
+                                build_request_messages(), stream=True
                             )
-                            st.write(assistant_response)
-                            audio_manager.text_to_speech(assistant_response)
+                        assistant_response = render_response(assistant_response)
+                        audio_manager.text_to_speech(assistant_response)
                     
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": assistant_response
-                    })
+                    conversation.add("assistant", assistant_response)
                 else:
                     st.error("No speech detected. Please try again.")
                     logger.warning("No speech detected in recording")
@@ -550,30 +738,23 @@ If asked about non-VW vehicles, politely redirect to VW equivalents."""
     
     # Text input
     if user_input := st.chat_input():
+        audio_manager = services.get("audio")
+        audio_manager.stop_speech()
         message_content = [{"type": "text", "text": user_input}]
         if st.session_state.current_image:
-            message_content.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{st.session_state.current_image}"
-                }
-            })
+            message_content.append(image_ref(st.session_state.current_image))
         
-        st.session_state.messages.append({
-            "role": "user",
-            "content": message_content
-        })
+        conversation.add("user", message_content)
         
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                assistant_response = process_ai_response(st.session_state.messages)
-                st.write(assistant_response)
-                audio_manager.text_to_speech(assistant_response)
+                assistant_response = process_ai_response(
+                    build_request_messages(), stream=True
+                )
+            assistant_response = render_response(assistant_response)
+            audio_manager.text_to_speech(assistant_response)
         
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": assistant_response
-        })
+        conversation.add("assistant", assistant_response)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
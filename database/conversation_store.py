@@ -0,0 +1,271 @@
+import atexit
+import json
+import logging
+import queue
+import re
+import threading
+from datetime import datetime
+from mysql.connector.errors import IntegrityError
+from database.db_setup import get_connection_pool
+from database.models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID = re.compile(r"[0-9a-f]{32}")
+
+def is_valid_session_id(value):
+    """Whether value fits the CHAR(32) key: a uuid4().hex string"""
+    return isinstance(value, str) and _SESSION_ID.fullmatch(value) is not None
+
+INSERT_MESSAGE = """
+    INSERT INTO conversation_messages (session_id, seq, role, content, created_at)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+def _message_row(message):
+    return (message.session_id, message.seq, message.role, json.dumps(message.content), message.created_at)
+
+class _ContentUpdate:
+    __slots__ = ("message",)
+
+    def __init__(self, message):
+        self.message = message
+
+class ConversationStore:
+    """Persists chat messages to the conversation_messages table.
+
+    ``append`` only enqueues the message; a background writer inserts
+    queued messages in batches, so a chat turn never waits on MySQL.
+    Messages are numbered per session (``seq``), which doubles as the
+    keyset for paging backwards through history. Numbers are handed out
+    by ``next_seq`` from MySQL's highest seq plus anything still queued;
+    if another process took a number first, the writer renumbers the
+    message after the current maximum instead of dropping it.
+    """
+
+    def __init__(self, db_pool, batch_size=50, flush_interval=1.0):
+        self.db_pool = db_pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = queue.Queue()
+        self._next_seqs = {}  # session_id -> next unused seq
+        self._seq_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-writer", daemon=True)
+        self._writer.start()
+
+    def next_seq(self, session_id, after=-1):
+        """Reserve the next seq for session_id; after is the caller's last known seq"""
+        with self._seq_lock:
+            seq = self._next_seqs.get(session_id)
+            if seq is None:
+                try:
+                    seq = self._max_seq(session_id) + 1
+                except Exception as e:
+                    logger.error(f"Error reading conversation seq: {str(e)}")
+                    seq = 0
+            seq = max(seq, after + 1)
+            self._next_seqs[session_id] = seq + 1
+            return seq
+
+    def _max_seq(self, session_id, cursor=None):
+        query = "SELECT COALESCE(MAX(seq), -1) FROM conversation_messages WHERE session_id = %s"
+        if cursor is not None:
+            cursor.execute(query, (session_id,))
+            return cursor.fetchone()[0]
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (session_id,))
+            max_seq = cursor.fetchone()[0]
+            cursor.close()
+        return max_seq
+
+    def append(self, message):
+        self._pending.put(message)
+
+    def update_content(self, message):
+        """Rewrite a stored message's content after it was edited in place"""
+        self._pending.put(_ContentUpdate(message))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written"""
+        done = threading.Event()
+        self._pending.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        while True:
+            batch, updates, waiters = [], [], []
+            item = self._pending.get()
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif isinstance(item, _ContentUpdate):
+                    updates.append(item.message)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._pending.get(timeout=self.flush_interval if batch else 0)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            if updates:
+                self._write_updates(updates)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_batch(self, batch):
+        try:
+            with self.db_pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.executemany(INSERT_MESSAGE, [_message_row(m) for m in batch])
+                except IntegrityError:
+                    # Some seqs were already taken by another writer
+                    conn.rollback()
+                    self._insert_renumbered(cursor, batch)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Error saving {len(batch)} conversation messages: {str(e)}")
+
+    def _insert_renumbered(self, cursor, batch, max_attempts=5):
+        """Insert one at a time, moving clashing messages after the session's current maximum"""
+        floors = {}  # session_id -> lowest seq the rest of the batch may use, to keep order
+        for message in batch:
+            message.seq = max(message.seq, floors.get(message.session_id, message.seq))
+            for attempt in range(max_attempts):
+                try:
+                    cursor.execute(INSERT_MESSAGE, _message_row(message))
+                    break
+                except IntegrityError:
+                    if attempt == max_attempts - 1:
+                        raise
+                    message.seq = self._max_seq(message.session_id, cursor) + 1
+            floors[message.session_id] = message.seq + 1
+            with self._seq_lock:
+                current = self._next_seqs.get(message.session_id, 0)
+                self._next_seqs[message.session_id] = max(current, message.seq + 1)
+
+    def _write_updates(self, messages):
+        try:
+            with self.db_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("""
+                    UPDATE conversation_messages SET content = %s WHERE session_id = %s AND seq = %s
+                """, [(json.dumps(m.content), m.session_id, m.seq) for m in messages])
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Error updating {len(messages)} conversation messages: {str(e)}")
+
+    def has_before(self, session_id, seq):
+        """Whether any stored message of session_id is older than seq"""
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM conversation_messages WHERE session_id = %s AND seq < %s LIMIT 1",
+                           (session_id, seq))
+            found = cursor.fetchone() is not None
+            cursor.close()
+        return found
+
+    def load_page(self, session_id, before_seq=None, limit=20):
+        """Return up to limit messages older than before_seq, oldest first"""
+        query = """
+            SELECT session_id, seq, role, content, created_at FROM conversation_messages
+            WHERE session_id = %s {} ORDER BY seq DESC LIMIT %s
+        """
+        if before_seq is None:
+            query, params = query.format(""), (session_id, limit)
+        else:
+            query, params = query.format("AND seq < %s"), (session_id, before_seq, limit)
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        return [ChatMessage(sid, seq, role, json.loads(content), created_at)
+                for sid, seq, role, content, created_at in reversed(rows)]
+
+
+class Conversation:
+    """One session's messages: a loaded tail of history plus new turns.
+
+    The render window holds the last ``visible`` messages: one page, plus
+    a page for each "Load earlier" click. New turns don't widen it.
+    """
+
+    def __init__(self, store, session_id, page_size=20):
+        self.store = store
+        self.session_id = session_id
+        self.page_size = page_size
+        self.visible = page_size
+        self._earlier = None  # (oldest loaded seq, whether MySQL has older messages)
+        try:
+            self.messages = store.load_page(session_id, limit=page_size)
+        except Exception as e:
+            logger.error(f"Error loading conversation history: {str(e)}")
+            self.messages = []
+
+    def add(self, role, content):
+        last_seq = self.messages[-1].seq if self.messages else -1
+        message = ChatMessage(self.session_id, self.store.next_seq(self.session_id, last_seq),
+                              role, content, datetime.now())
+        self.messages.append(message)
+        self.store.append(message)
+        return message
+
+    def set_content(self, message, content):
+        """Edit a message and persist the new content"""
+        message.content = content
+        self.store.update_content(message)
+
+    def has_earlier(self):
+        if self.visible < len(self.messages):
+            return True
+        if not self.messages:
+            return False
+        # seqs can have gaps, so ask MySQL (once per oldest loaded message)
+        oldest = self.messages[0].seq
+        if self._earlier is None or self._earlier[0] != oldest:
+            try:
+                self._earlier = (oldest, self.store.has_before(self.session_id, oldest))
+            except Exception as e:
+                logger.error(f"Error checking for earlier messages: {str(e)}")
+                return False
+        return self._earlier[1]
+
+    def load_earlier(self):
+        """Reveal the previous page, fetching it from MySQL if it isn't loaded yet"""
+        if self.visible >= len(self.messages) and self.messages:
+            try:
+                older = self.store.load_page(self.session_id, before_seq=self.messages[0].seq,
+                                             limit=self.page_size)
+                self.messages[:0] = older
+                if not older:
+                    self._earlier = (self.messages[0].seq, False)
+            except Exception as e:
+                logger.error(f"Error loading earlier messages: {str(e)}")
+        self.visible += self.page_size
+
+    def recent(self):
+        """Messages inside the render window"""
+        return self.messages[-self.visible:] if self.visible else []
+
+    def as_dicts(self):
+        return [message.to_dict() for message in self.messages]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_conversation_store():
+    """Return the process-wide conversation store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore(get_connection_pool())
+            atexit.register(_store.flush, 5)
+        return _store
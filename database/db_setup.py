@@ -1,6 +1,12 @@
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -44,6 +50,265 @@ def create_database_connection():
         print(f"Error connecting to MySQL Database: {e}")
         return None
 
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections shared by all sessions.
+
+    Connections are health-checked on checkout, idle connections are reaped
+    after ``max_idle_time`` seconds and the time callers spend waiting for a
+    free connection is tracked in ``get_stats()``.
+    """
+
+    def __init__(self, max_size=10, max_idle_time=300, checkout_timeout=10,
+                 connect=None):
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.checkout_timeout = checkout_timeout
+        self._connect = connect or self._default_connect
+        self._idle = deque()  # (connection, released_at)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'reaped': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    @staticmethod
+    def _default_connect():
+        return mysql.connector.connect(
+            host=os.getenv('MYSQL_HOST'),
+            user=os.getenv('MYSQL_USER'),
+            password=os.getenv('MYSQL_PASSWORD'),
+            database=os.getenv('MYSQL_DATABASE')
+        )
+
+    def acquire(self, timeout=None):
+        """Check out a healthy connection, waiting if the pool is exhausted"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                self._reap_idle_locked()
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolError(
+                        f"Timed out after {timeout}s waiting for a database connection"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            wait_time = time.monotonic() - start
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+            self._stats['wait_time_total'] += wait_time
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+        if conn is not None and not self._is_healthy(conn):
+            self._close_quietly(conn)
+            with self._cond:
+                self._stats['discarded'] += 1
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or drop it if it is broken"""
+        if not discard:
+            try:
+                # End any open transaction so the next user sees fresh data
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard:
+                self._size -= 1
+                self._stats['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if discard:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except Error:
+            self.release(conn, discard=not self._is_healthy(conn))
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def reap_idle(self):
+        """Close connections that have been idle longer than max_idle_time"""
+        with self._cond:
+            return self._reap_idle_locked()
+
+    def _reap_idle_locked(self):
+        now = time.monotonic()
+        reaped = 0
+        # Oldest connections sit at the left end of the deque
+        while self._idle and now - self._idle[0][1] > self.max_idle_time:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            reaped += 1
+            self._close_quietly(conn)
+        if reaped:
+            self._stats['reaped'] += reaped
+            self._cond.notify(reaped)
+        return reaped
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def get_stats(self):
+        """Snapshot of pool size and checkout/wait metrics"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on release)"""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    max_size=int(os.getenv('MYSQL_POOL_SIZE') or 10),
+                    max_idle_time=float(os.getenv('MYSQL_POOL_MAX_IDLE') or 300),
+                    checkout_timeout=float(os.getenv('MYSQL_POOL_TIMEOUT') or 10)
+                )
+    return _pool
+
+def db_connection(timeout=None):
+    """Shortcut for ``get_connection_pool().connection()``"""
+    return get_connection_pool().connection(timeout)
+
+def ensure_index(cursor, table, index_name, columns):
+    """Create an index on an existing table if it is missing"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index_name))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"CREATE INDEX {index_name} ON {table} {columns}")
+
+def ensure_column(cursor, table, column, definition):
+    """Add a column to an existing table if it is missing"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def ensure_monthly_partitions(cursor, table, months_ahead=2, today=None):
+    """Split the catch-all p_future partition so every month up to months_ahead has its own.
+
+    Tables are created with a single ``p_future`` (MAXVALUE) partition on a
+    RANGE COLUMNS datetime; call this at startup (or from a monthly job).
+    """
+    cursor.execute("""
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    existing = {row[0] for row in cursor.fetchall()}
+    latest = max((name for name in existing if name != 'p_future'), default="")
+    today = today or date.today()
+    year, month = today.year, today.month
+    new_partitions = []
+    for _ in range(months_ahead + 1):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        name = f"p{year}{month:02d}"
+        # Only months after the newest partition can be split off p_future
+        if name > latest:
+            new_partitions.append(
+                f"PARTITION {name} VALUES LESS THAN ('{next_year}-{next_month:02d}-01')"
+            )
+        year, month = next_year, next_month
+    if new_partitions and 'p_future' in existing:
+        cursor.execute(
+            f"ALTER TABLE {table} REORGANIZE PARTITION p_future INTO ("
+            + ", ".join(new_partitions)
+            + ", PARTITION p_future VALUES LESS THAN (MAXVALUE))"
+        )
+
+def drop_partitions_before(cursor, table, before):
+    """Drop monthly partitions that only hold rows older than the given date"""
+    cursor.execute("""
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name LIKE 'p______'
+    """, (table,))
+    expired = [row[0] for row in cursor.fetchall() if row[0] < f"p{before.year}{before.month:02d}"]
+    if expired:
+        cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+    return expired
+
 def initialize_database():
     create_database()
     connection = create_database_connection()
@@ -64,9 +329,22 @@ def initialize_database():
             tire_pressure JSON,
             engine_oil_life FLOAT,
             last_service_date DATE,
-            PRIMARY KEY (id)
+            updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+            PRIMARY KEY (id),
+            INDEX idx_vehicles_updated_at (updated_at),
+            INDEX idx_vehicles_vin (vin),
+            INDEX idx_vehicles_model_year (model, year),
+            INDEX idx_vehicles_year (year)
         )
     """)
+    # Tables created before rows were versioned
+    ensure_column(cursor, 'vehicles', 'updated_at',
+                  'DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)')
+    ensure_index(cursor, 'vehicles', 'idx_vehicles_updated_at', '(updated_at)')
+    # Vehicle picker search columns
+    ensure_index(cursor, 'vehicles', 'idx_vehicles_vin', '(vin)')
+    ensure_index(cursor, 'vehicles', 'idx_vehicles_model_year', '(model, year)')
+    ensure_index(cursor, 'vehicles', 'idx_vehicles_year', '(year)')
 
     # Create maintenance_records table
     cursor.execute("""
@@ -78,6 +356,22 @@ def initialize_database():
             mileage FLOAT,
             description TEXT,
             PRIMARY KEY (id),
+            INDEX idx_maintenance_vehicle_date (vehicle_id, service_date),
+            FOREIGN KEY (vehicle_id) REFERENCES vehicles(id)
+        )
+    """)
+    ensure_index(cursor, 'maintenance_records', 'idx_maintenance_vehicle_date', '(vehicle_id, service_date)')
+
+    # Create vehicle_service_due table (next due service per vehicle, kept up to date on insert)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vehicle_service_due (
+            vehicle_id INT NOT NULL,
+            service_kind VARCHAR(32) NOT NULL,
+            last_service_date DATE NOT NULL,
+            last_service_mileage FLOAT,
+            next_due_date DATE NOT NULL,
+            next_due_mileage FLOAT,
+            PRIMARY KEY (vehicle_id, service_kind),
             FOREIGN KEY (vehicle_id) REFERENCES vehicles(id)
         )
     """)
@@ -102,7 +396,53 @@ def initialize_database():
             phone_number VARCHAR(15) NOT NULL,
             latitude DECIMAL(10,8) NOT NULL,
             longitude DECIMAL(11,8) NOT NULL,
-            PRIMARY KEY (id)
+            PRIMARY KEY (id),
+            INDEX idx_police_stations_lat_lon (latitude, longitude)
+        )
+    """)
+    # Tables created before the index existed
+    ensure_index(cursor, 'police_stations', 'idx_police_stations_lat_lon', '(latitude, longitude)')
+
+    # Create conversation_messages table (chat history, paged by seq)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_messages (
+            session_id CHAR(32) NOT NULL,
+            seq INT NOT NULL,
+            role VARCHAR(16) NOT NULL,
+            content JSON NOT NULL,
+            created_at DATETIME(6) NOT NULL,
+            PRIMARY KEY (session_id, seq)
+        )
+    """)
+
+    # Create telemetry tables: raw readings partitioned by month, plus rollups
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS telemetry_readings (
+            vehicle_id INT NOT NULL,
+            recorded_at DATETIME(3) NOT NULL,
+            metric VARCHAR(32) NOT NULL,
+            value DOUBLE NOT NULL,
+            PRIMARY KEY (vehicle_id, metric, recorded_at)
+        )
+        PARTITION BY RANGE COLUMNS (recorded_at) (
+            PARTITION p_future VALUES LESS THAN (MAXVALUE)
+        )
+    """)
+    ensure_monthly_partitions(cursor, 'telemetry_readings')
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS telemetry_rollups (
+            vehicle_id INT NOT NULL,
+            metric VARCHAR(32) NOT NULL,
+            granularity ENUM('minute', 'hour') NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            sample_count INT NOT NULL,
+            value_sum DOUBLE NOT NULL,
+            value_min DOUBLE NOT NULL,
+            value_max DOUBLE NOT NULL,
+            value_last DOUBLE NOT NULL,
+            last_at DATETIME(3) NOT NULL,
+            PRIMARY KEY (vehicle_id, metric, granularity, bucket_start)
         )
     """)
 
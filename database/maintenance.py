@@ -0,0 +1,169 @@
+import logging
+import threading
+from datetime import timedelta
+from database.db_setup import get_connection_pool
+from database.models import MaintenanceRecord, ServiceDue
+from utils.cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+# Tracked service kinds: (days between services, miles between services)
+SERVICE_INTERVALS = {
+    'oil_change': (365, 10000),
+    'tire_rotation': (180, 7500),
+    'brake_inspection': (365, 12000),
+}
+
+# Services kept in memory per vehicle; larger "last N" requests go to MySQL
+CACHED_RECORDS = 20
+
+RECORD_COLUMNS = "id, vehicle_id, service_date, service_type, mileage, description"
+DUE_COLUMNS = ("vehicle_id, service_kind, last_service_date, last_service_mileage, "
+               "next_due_date, next_due_mileage")
+
+def service_kind(service_type):
+    """Map a free-text service type onto a SERVICE_INTERVALS key, or None"""
+    text = (service_type or "").lower()
+    if "oil" in text:
+        return 'oil_change'
+    if "tire" in text or "tyre" in text:
+        return 'tire_rotation' if "rotat" in text else None
+    if "brake" in text:
+        return 'brake_inspection'
+    return None
+
+def _due_row(vehicle_id, kind, service_date, mileage):
+    days, miles = SERVICE_INTERVALS[kind]
+    return (vehicle_id, kind, service_date, mileage,
+            service_date + timedelta(days=days),
+            mileage + miles if mileage is not None else None)
+
+# Only a service at least as recent as the stored one moves the due dates.
+# Columns are assigned left to right, so last_service_date is updated last.
+UPSERT_DUE = f"""
+    INSERT INTO vehicle_service_due ({DUE_COLUMNS})
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        last_service_mileage = IF(VALUES(last_service_date) >= last_service_date,
+                                  VALUES(last_service_mileage), last_service_mileage),
+        next_due_date = IF(VALUES(last_service_date) >= last_service_date,
+                           VALUES(next_due_date), next_due_date),
+        next_due_mileage = IF(VALUES(last_service_date) >= last_service_date,
+                              VALUES(next_due_mileage), next_due_mileage),
+        last_service_date = GREATEST(last_service_date, VALUES(last_service_date))
+"""
+
+class MaintenanceRepository:
+    """Service history and precomputed service-due dates per vehicle.
+
+    History reads are bounded "last N" fetches served by the
+    (vehicle_id, service_date) index. ``vehicle_service_due`` holds the
+    next due date and mileage for each tracked service kind; it is updated
+    in the same transaction as every record inserted through
+    ``add_record``, so reading it is a single primary-key lookup. A vehicle
+    with history but no due rows yet (records loaded some other way) is
+    backfilled from its history on first read.
+    """
+
+    def __init__(self, db_pool):
+        self.db_pool = db_pool
+        self._cache = get_cache("maintenance", ttl=300, max_size=512)
+
+    def recent_records(self, vehicle_id, limit=5):
+        """The vehicle's last limit services, newest first"""
+        if limit > CACHED_RECORDS:
+            return self._load_records(vehicle_id, limit)
+        records = self._cache.get_or_load(('records', vehicle_id),
+                                          lambda: self._load_records(vehicle_id, CACHED_RECORDS))
+        return records[:limit]
+
+    def _load_records(self, vehicle_id, limit):
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(prepared=True)
+            cursor.execute(f"""
+                SELECT {RECORD_COLUMNS} FROM maintenance_records
+                WHERE vehicle_id = %s ORDER BY service_date DESC, id DESC LIMIT %s
+            """, (vehicle_id, limit))
+            rows = cursor.fetchall()
+            cursor.close()
+        return [MaintenanceRecord(*row) for row in rows]
+
+    def service_due(self, vehicle_id):
+        """ServiceDue entries for the vehicle, soonest first"""
+        return self._cache.get_or_load(('due', vehicle_id), lambda: self._load_due(vehicle_id))
+
+    def _load_due(self, vehicle_id, backfill=True):
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(prepared=True)
+            cursor.execute(f"""
+                SELECT {DUE_COLUMNS} FROM vehicle_service_due
+                WHERE vehicle_id = %s ORDER BY next_due_date
+            """, (vehicle_id,))
+            rows = cursor.fetchall()
+            cursor.close()
+        if not rows and backfill and self.rebuild_service_due(vehicle_id):
+            return self._load_due(vehicle_id, backfill=False)
+        return [ServiceDue(*row) for row in rows]
+
+    def add_record(self, vehicle_id, service_date, service_type, mileage=None, description=None):
+        """Insert a service record and move the matching service-due entry forward"""
+        kind = service_kind(service_type)
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(prepared=True)
+            cursor.execute("""
+                INSERT INTO maintenance_records (vehicle_id, service_date, service_type, mileage, description)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (vehicle_id, service_date, service_type, mileage, description))
+            record_id = cursor.lastrowid
+            if kind:
+                cursor.execute(UPSERT_DUE, _due_row(vehicle_id, kind, service_date, mileage))
+            conn.commit()
+            cursor.close()
+        self.invalidate(vehicle_id)
+        return record_id
+
+    def rebuild_service_due(self, vehicle_id=None):
+        """Recompute vehicle_service_due from the history of one vehicle, or all of them"""
+        query = """
+            SELECT vehicle_id, service_type, service_date, mileage FROM maintenance_records
+            WHERE service_date IS NOT NULL {} ORDER BY vehicle_id, service_date, id
+        """
+        if vehicle_id is None:
+            query, params = query.format(""), ()
+        else:
+            query, params = query.format("AND vehicle_id = %s"), (vehicle_id,)
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            latest = {}
+            for row_vehicle_id, service_type, service_date, mileage in cursor.fetchall():
+                kind = service_kind(service_type)
+                if kind:
+                    latest[(row_vehicle_id, kind)] = (service_date, mileage)
+            if latest:
+                cursor.executemany(UPSERT_DUE, [_due_row(row_vehicle_id, kind, service_date, mileage)
+                                                for (row_vehicle_id, kind), (service_date, mileage)
+                                                in latest.items()])
+            conn.commit()
+            cursor.close()
+        if vehicle_id is None:
+            self._cache.invalidate()
+        else:
+            self.invalidate(vehicle_id)
+        return len(latest)
+
+    def invalidate(self, vehicle_id):
+        self._cache.invalidate(('records', vehicle_id))
+        self._cache.invalidate(('due', vehicle_id))
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_maintenance_repository():
+    """Return the process-wide maintenance repository"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = MaintenanceRepository(get_connection_pool())
+        return _repository
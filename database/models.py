@@ -1,19 +1,37 @@
+import json
 from dataclasses import dataclass
+from datetime import date, datetime
 from decimal import Decimal
+from typing import Any, Optional
 
-@dataclass
+@dataclass(slots=True)
 class Vehicle:
     id: int
     model: str
     year: int
     vin: str
     current_mileage: float
-    battery_level: float
+    battery_level: Optional[float]
     tire_pressure: dict
     engine_oil_life: float
-    last_service_date: str
+    last_service_date: Optional[date]
+    updated_at: Optional[datetime] = None  # row version, bumped by MySQL on every update
 
-@dataclass
+    # Column order expected by from_row
+    COLUMNS = ("id", "model", "year", "vin", "current_mileage", "battery_level",
+               "tire_pressure", "engine_oil_life", "last_service_date", "updated_at")
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a Vehicle from a tuple in COLUMNS order, decoding tire_pressure once"""
+        values = list(row)
+        tire_pressure = values[6]
+        if isinstance(tire_pressure, (bytes, bytearray)):
+            tire_pressure = tire_pressure.decode('utf-8')
+        values[6] = json.loads(tire_pressure) if isinstance(tire_pressure, str) else (tire_pressure or {})
+        return cls(*values)
+
+@dataclass(slots=True)
 class MaintenanceRecord:
     id: int
     vehicle_id: int
@@ -22,6 +40,31 @@ class MaintenanceRecord:
     mileage: float
     description: str
 
+    def to_dict(self):
+        return {
+            "service_date": str(self.service_date),
+            "service_type": self.service_type,
+            "mileage": self.mileage,
+            "description": self.description,
+        }
+
+@dataclass(slots=True)
+class ServiceDue:
+    vehicle_id: int
+    service_kind: str
+    last_service_date: date
+    last_service_mileage: Optional[float]
+    next_due_date: date
+    next_due_mileage: Optional[float]
+
+    def to_dict(self):
+        return {
+            "service": self.service_kind,
+            "last_service_date": str(self.last_service_date),
+            "next_due_date": str(self.next_due_date),
+            "next_due_mileage": self.next_due_mileage,
+        }
+
 @dataclass
 class EmergencyContact:
     id: int
@@ -36,4 +79,16 @@ class PoliceStation:
     address: str
     phone_number: str
     latitude: Decimal
-    longitude: Decimal
\ No newline at end of file
+    longitude: Decimal
+
+@dataclass(slots=True)
+class ChatMessage:
+    session_id: str
+    seq: int
+    role: str
+    content: Any  # str, or a list of content parts
+    created_at: datetime
+
+    def to_dict(self):
+        """The role/content dict the chat completion API expects"""
+        return {"role": self.role, "content": self.content}
\ No newline at end of file
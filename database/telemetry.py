@@ -0,0 +1,261 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from database.db_setup import ensure_monthly_partitions, get_connection_pool
+from utils.cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+# Bucket start for each rollup granularity
+ROLLUP_BUCKETS = {
+    'minute': lambda ts: ts.replace(second=0, microsecond=0),
+    'hour': lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+}
+
+# Metrics the trend summary reports (everything snapshot_readings records)
+TREND_METRICS = ('battery_level', 'engine_oil_life', 'current_mileage',
+                 'tire_FL', 'tire_FR', 'tire_RL', 'tire_RR')
+
+# History spans up to this long are read from minute rollups, longer ones from hourly
+MINUTE_ROLLUP_SPAN = timedelta(hours=12)
+
+def snapshot_readings(vehicle):
+    """Metric -> value for the telemetry fields of a Vehicle"""
+    readings = {}
+    for metric in ('battery_level', 'engine_oil_life', 'current_mileage'):
+        value = getattr(vehicle, metric)
+        if value is not None:
+            readings[metric] = float(value)
+    for position, psi in (vehicle.tire_pressure or {}).items():
+        if psi is not None:
+            readings[f"tire_{position}"] = float(psi)
+    return readings
+
+def _rollups(rows):
+    """(vehicle_id, metric, granularity, bucket_start) -> [count, sum, min, max, last, last_at]"""
+    rollups = {}
+    for vehicle_id, recorded_at, metric, value in rows:
+        for granularity, bucket in ROLLUP_BUCKETS.items():
+            key = (vehicle_id, metric, granularity, bucket(recorded_at))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = [1, value, value, value, value, recorded_at]
+                continue
+            rollup[0] += 1
+            rollup[1] += value
+            rollup[2] = min(rollup[2], value)
+            rollup[3] = max(rollup[3], value)
+            if recorded_at >= rollup[5]:
+                rollup[4], rollup[5] = value, recorded_at
+    return rollups
+
+class TelemetryStore:
+    """Append-only vehicle telemetry with precomputed rollups.
+
+    Raw readings go to ``telemetry_readings``, one row per metric, in
+    monthly partitions. The newly inserted readings of every batch are
+    also aggregated in memory into per-minute and per-hour buckets that
+    are upserted into ``telemetry_rollups`` in the same transaction, so
+    history and trend queries read a few hundred rollup rows instead of
+    scanning raw data.
+    """
+
+    def __init__(self, db_pool, batch_size=1000, flush_interval=1.0, snapshot_interval=60):
+        self.db_pool = db_pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self._last_snapshot = {}  # vehicle_id -> monotonic time
+        self._history_cache = get_cache("telemetry_history", ttl=60, max_size=256)
+        self._pending = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="telemetry-writer", daemon=True)
+        self._writer.start()
+
+    def prepare_partitions(self, months_ahead=2):
+        """Make sure the current and next months have their own raw-reading partitions"""
+        try:
+            with self.db_pool.connection() as conn:
+                cursor = conn.cursor()
+                ensure_monthly_partitions(cursor, 'telemetry_readings', months_ahead)
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Error preparing telemetry partitions: {str(e)}")
+
+    def record(self, vehicle_id, readings, recorded_at=None):
+        """Queue a metric -> value dict measured at recorded_at (default now)"""
+        recorded_at = recorded_at or datetime.now()
+        for metric, value in readings.items():
+            self._pending.put((vehicle_id, recorded_at, metric, float(value)))
+
+    def record_snapshot(self, vehicle):
+        """Record a Vehicle's current values, at most once per snapshot_interval per vehicle"""
+        now = time.monotonic()
+        last = self._last_snapshot.get(vehicle.id)
+        if last is not None and now - last < self.snapshot_interval:
+            return False
+        self._last_snapshot[vehicle.id] = now
+        self.record(vehicle.id, snapshot_readings(vehicle))
+        return True
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written"""
+        done = threading.Event()
+        self._pending.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        while True:
+            batch, waiters = [], []
+            item = self._pending.get()
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._pending.get(timeout=self.flush_interval if batch else 0)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.ingest(batch)
+                except Exception as e:
+                    logger.error(f"Error saving {len(batch)} telemetry readings: {str(e)}")
+            for waiter in waiters:
+                waiter.set()
+
+    def ingest(self, rows):
+        """Bulk insert (vehicle_id, recorded_at, metric, value) rows and update rollups"""
+        # recorded_at is stored to the millisecond; truncate so keys compare equal to stored ones
+        rows = [(vehicle_id, recorded_at.replace(microsecond=recorded_at.microsecond // 1000 * 1000),
+                 metric, float(value))
+                for vehicle_id, recorded_at, metric, value in rows]
+        # Repeated readings would be rejected by the table but counted twice in rollups
+        rows = list({(r[0], r[1], r[2]): r for r in rows}.values())
+        if not rows:
+            return 0
+
+        vehicle_ids = sorted({r[0] for r in rows})
+        metrics = sorted({r[2] for r in rows})
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            # Readings stored by an earlier (replayed) batch must not reach the rollups again.
+            # The locking read also keeps another writer from inserting them meanwhile.
+            cursor.execute(f"""
+                SELECT vehicle_id, recorded_at, metric FROM telemetry_readings
+                WHERE vehicle_id IN ({', '.join(['%s'] * len(vehicle_ids))})
+                  AND metric IN ({', '.join(['%s'] * len(metrics))})
+                  AND recorded_at BETWEEN %s AND %s
+                FOR UPDATE
+            """, (*vehicle_ids, *metrics, min(r[1] for r in rows), max(r[1] for r in rows)))
+            stored = set(cursor.fetchall())
+            rows = [r for r in rows if (r[0], r[1], r[2]) not in stored]
+            if rows:
+                cursor.executemany("""
+                    INSERT INTO telemetry_readings (vehicle_id, recorded_at, metric, value)
+                    VALUES (%s, %s, %s, %s)
+                """, rows)
+                # value_last is assigned before last_at so it compares against the old timestamp
+                cursor.executemany("""
+                    INSERT INTO telemetry_rollups (vehicle_id, metric, granularity, bucket_start,
+                        sample_count, value_sum, value_min, value_max, value_last, last_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        value_last = IF(VALUES(last_at) >= last_at, VALUES(value_last), value_last),
+                        last_at = GREATEST(last_at, VALUES(last_at)),
+                        sample_count = sample_count + VALUES(sample_count),
+                        value_sum = value_sum + VALUES(value_sum),
+                        value_min = LEAST(value_min, VALUES(value_min)),
+                        value_max = GREATEST(value_max, VALUES(value_max))
+                """, [key + tuple(values) for key, values in _rollups(rows).items()])
+            conn.commit()
+            cursor.close()
+        return len(rows)
+
+    def history(self, vehicle_id, metric, since, until=None, granularity=None):
+        """(bucket_start, avg, min, max) rows for one metric, oldest first"""
+        until = until or datetime.now()
+        if granularity is None:
+            granularity = 'minute' if until - since <= MINUTE_ROLLUP_SPAN else 'hour'
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT bucket_start, value_sum / sample_count, value_min, value_max
+                FROM telemetry_rollups
+                WHERE vehicle_id = %s AND metric = %s AND granularity = %s
+                  AND bucket_start >= %s AND bucket_start < %s
+                ORDER BY bucket_start
+            """, (vehicle_id, metric, granularity, ROLLUP_BUCKETS[granularity](since), until))
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+
+    def recent_history(self, vehicle_id, metric, days=7):
+        """history() over the last days, cached for a minute across reruns"""
+        return self._history_cache.get_or_load(
+            (vehicle_id, metric, days),
+            lambda: self.history(vehicle_id, metric, datetime.now() - timedelta(days=days))
+        )
+
+    def trend_summary(self, vehicle_id, days=7, metrics=TREND_METRICS):
+        """Per-metric latest/min/max/avg/change over the last days, from hourly rollups"""
+        return self._history_cache.get_or_load(('summary', vehicle_id, days, tuple(metrics)),
+                                               lambda: self._trend_summary(vehicle_id, days, metrics))
+
+    def _trend_summary(self, vehicle_id, days, metrics):
+        since = datetime.now() - timedelta(days=days)
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            # Naming the metrics lets each one be a range scan on the
+            # (vehicle_id, metric, granularity, bucket_start) primary key
+            cursor.execute(f"""
+                SELECT metric, sample_count, value_sum, value_min, value_max, value_last
+                FROM telemetry_rollups
+                WHERE vehicle_id = %s AND metric IN ({', '.join(['%s'] * len(metrics))})
+                  AND granularity = 'hour' AND bucket_start >= %s
+                ORDER BY metric, bucket_start
+            """, (vehicle_id, *metrics, ROLLUP_BUCKETS['hour'](since)))
+            rows = cursor.fetchall()
+            cursor.close()
+
+        summary = {}
+        for metric, count, total, low, high, last in rows:
+            entry = summary.get(metric)
+            if entry is None:
+                summary[metric] = entry = {'first': total / count, 'count': 0, 'sum': 0.0,
+                                           'min': low, 'max': high}
+            entry['count'] += count
+            entry['sum'] += total
+            entry['min'] = min(entry['min'], low)
+            entry['max'] = max(entry['max'], high)
+            entry['latest'] = last
+        return {
+            metric: {
+                'latest': round(entry['latest'], 2),
+                'min': round(entry['min'], 2),
+                'max': round(entry['max'], 2),
+                'avg': round(entry['sum'] / entry['count'], 2),
+                'change': round(entry['latest'] - entry['first'], 2),
+                'samples': entry['count'],
+            }
+            for metric, entry in summary.items()
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_telemetry_store():
+    """Return the process-wide telemetry store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TelemetryStore(get_connection_pool())
+            _store.prepare_partitions()
+            atexit.register(_store.flush, 5)
+        return _store
@@ -0,0 +1,213 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from database.db_setup import get_connection_pool
+from database.models import Vehicle
+from utils.cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+SELECT_VEHICLE = f"SELECT {', '.join(Vehicle.COLUMNS)} FROM vehicles WHERE id = %s"
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_filters(query):
+    """WHERE clauses and params for a picker query.
+
+    Four-digit tokens match the year, tokens with letters and digits of at
+    least five characters are VIN prefixes, and the remaining words are a
+    model prefix ("2024 id.4", "WVGZZ", "golf gti"). Every filter is a
+    prefix or equality match so it can use an index.
+    """
+    clauses, params, model_words = [], [], []
+    for token in query.split():
+        if len(token) == 4 and token.isdigit():
+            clauses.append("year = %s")
+            params.append(int(token))
+        elif len(token) >= 5 and token.isalnum() and not token.isalpha() and not token.isdigit():
+            clauses.append("vin LIKE %s")
+            params.append(_escape_like(token.upper()) + "%")
+        else:
+            model_words.append(token)
+    if model_words:
+        clauses.append("model LIKE %s")
+        params.append(_escape_like(" ".join(model_words)) + "%")
+    return clauses, params
+
+class VehicleRepository:
+    """Loads vehicles as ``Vehicle`` instances and keeps them in memory.
+
+    Rows are read with prepared statements and tire_pressure is decoded
+    once per row version. Cached vehicles are revalidated by polling for
+    rows whose ``updated_at`` moved past the newest version seen, at most
+    every ``revalidate_after`` seconds and with one query for the whole
+    cache, so most reruns never touch MySQL. A transaction that commits
+    after a poll with an older ``updated_at`` slips under the high-water
+    mark, so every ``full_revalidate_after`` seconds the poll instead
+    compares every cached vehicle's version. Writes made through the
+    repository invalidate their vehicle immediately.
+    """
+
+    def __init__(self, db_pool, max_size=256, revalidate_after=5.0, full_revalidate_after=60.0):
+        self.db_pool = db_pool
+        self.max_size = max_size
+        self.revalidate_after = revalidate_after
+        self.full_revalidate_after = full_revalidate_after
+        self._vehicles = OrderedDict()  # id -> Vehicle
+        self._high_water = None  # newest updated_at seen
+        self._last_poll = 0.0
+        self._last_full_poll = time.monotonic()
+        self._lock = threading.Lock()
+        self._search_cache = get_cache("vehicle_search", ttl=30, max_size=512)
+        self.stats = {'hits': 0, 'loads': 0, 'invalidations': 0, 'polls': 0}
+
+    def get(self, vehicle_id):
+        """Return the Vehicle with this id, or None if it doesn't exist"""
+        self._revalidate()
+        with self._lock:
+            vehicle = self._vehicles.get(vehicle_id)
+            if vehicle is not None:
+                self._vehicles.move_to_end(vehicle_id)
+                self.stats['hits'] += 1
+                return vehicle
+
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(prepared=True)
+            cursor.execute(SELECT_VEHICLE, (vehicle_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        if row is None:
+            return None
+        vehicle = Vehicle.from_row(row)
+        self._store(vehicle)
+        return vehicle
+
+    def _store(self, vehicle):
+        with self._lock:
+            self.stats['loads'] += 1
+            self._vehicles[vehicle.id] = vehicle
+            self._vehicles.move_to_end(vehicle.id)
+            while len(self._vehicles) > self.max_size:
+                self._vehicles.popitem(last=False)
+            if vehicle.updated_at and (self._high_water is None or vehicle.updated_at > self._high_water):
+                self._high_water = vehicle.updated_at
+
+    def _revalidate(self):
+        with self._lock:
+            if not self._vehicles or time.monotonic() - self._last_poll < self.revalidate_after:
+                return
+            self._last_poll = time.monotonic()
+            high_water = self._high_water
+            full = self._last_poll - self._last_full_poll >= self.full_revalidate_after
+            if full:
+                self._last_full_poll = self._last_poll
+                cached_ids = list(self._vehicles)
+        try:
+            with self.db_pool.connection() as conn:
+                cursor = conn.cursor(prepared=True)
+                if full:
+                    cursor.execute(
+                        f"SELECT id, updated_at FROM vehicles WHERE id IN ({', '.join(['%s'] * len(cached_ids))})",
+                        cached_ids
+                    )
+                elif high_water is None:
+                    cursor.execute("SELECT id, updated_at FROM vehicles WHERE updated_at IS NOT NULL")
+                else:
+                    # >= so a second change within the same microsecond isn't missed
+                    cursor.execute("SELECT id, updated_at FROM vehicles WHERE updated_at >= %s",
+                                   (high_water,))
+                changed = cursor.fetchall()
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Error checking vehicles for changes: {str(e)}")
+            return
+
+        with self._lock:
+            self.stats['polls'] += 1
+            if full:
+                # Vehicles deleted since they were cached
+                found = {vehicle_id for vehicle_id, _ in changed}
+                for vehicle_id in cached_ids:
+                    if vehicle_id not in found and self._vehicles.pop(vehicle_id, None) is not None:
+                        self.stats['invalidations'] += 1
+            for vehicle_id, updated_at in changed:
+                cached = self._vehicles.get(vehicle_id)
+                if cached is not None and cached.updated_at != updated_at:
+                    del self._vehicles[vehicle_id]
+                    self.stats['invalidations'] += 1
+                if updated_at and (self._high_water is None or updated_at > self._high_water):
+                    self._high_water = updated_at
+
+    def invalidate(self, vehicle_id=None):
+        """Drop one vehicle (or all of them) from the cache"""
+        with self._lock:
+            if vehicle_id is None:
+                self._vehicles.clear()
+            elif self._vehicles.pop(vehicle_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def search(self, query="", after_id=None, limit=25):
+        """One page of (id, model, year, vin) matches ordered by id.
+
+        Pages are keyset paginated: pass the returned cursor as after_id to
+        get the next page. The cursor is None on the last page. Pages are
+        cached briefly, so reruns while the driver types don't re-query.
+        """
+        key = (" ".join(query.lower().split()), after_id, limit)
+        return self._search_cache.get_or_load(key, lambda: self._search(query, after_id, limit))
+
+    def _search(self, query, after_id, limit):
+        clauses, params = search_filters(query)
+        if after_id is not None:
+            clauses.append("id > %s")
+            params.append(after_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(prepared=True)
+            # One extra row tells us whether there is a next page
+            cursor.execute(f"SELECT id, model, year, vin FROM vehicles {where} ORDER BY id LIMIT %s",
+                           (*params, limit + 1))
+            rows = cursor.fetchall()
+            cursor.close()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1][0]
+        return rows, None
+
+    def update(self, vehicle_id, **fields):
+        """Update columns of one vehicle and invalidate its cached copy"""
+        columns = [c for c in fields if c in Vehicle.COLUMNS and c not in ('id', 'updated_at')]
+        if not columns:
+            return 0
+        values = [json.dumps(fields[c]) if c == 'tire_pressure' else fields[c] for c in columns]
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(prepared=True)
+            cursor.execute(
+                f"UPDATE vehicles SET {', '.join(f'{c} = %s' for c in columns)} WHERE id = %s",
+                (*values, vehicle_id)
+            )
+            updated = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        self.invalidate(vehicle_id)
+        self._search_cache.invalidate()
+        return updated
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'cached': len(self._vehicles)}
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_vehicle_repository():
+    """Return the process-wide vehicle repository"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = VehicleRepository(get_connection_pool())
+        return _repository
@@ -4,8 +4,18 @@ import numpy as np
 from groq import Groq
 from elevenlabs.client import ElevenLabs
 from elevenlabs import play
+import io
 import os
+import queue
+import re
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
+from utils.cache import CACHE_DIR
+from utils.metrics import latency
+from utils.speech_cache import SpeechCache
+from utils.transcription import StreamingTranscriber
 
 load_dotenv()
 
@@ -14,23 +24,160 @@ import logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+TTS_VOICE = "Daniel"
+TTS_MODEL = "eleven_multilingual_v2"
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+
+def split_sentences(text, min_length=20):
+    """Split text into sentences, merging fragments shorter than min_length"""
+    sentences = []
+    pending = ""
+    for part in SENTENCE_BOUNDARY.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_length:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+class SpeechPipeline:
+    """Synthesizes the next sentence while the current one is playing.
+
+    One worker thread turns sentences into audio and hands them to a
+    second worker that plays them in order, so the Streamlit script thread
+    never blocks on playback. ``cancel()`` drops everything queued for the
+    current turn; a sentence already playing is allowed to finish.
+    """
+
+    def __init__(self, lookahead=2):
+        self._sentences = queue.Queue()
+        self._audio = queue.Queue(maxsize=lookahead)
+        self._generation = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._synthesize_worker, name="tts-synth", daemon=True).start()
+        threading.Thread(target=self._playback_worker, name="tts-play", daemon=True).start()
+
+    def speak(self, sentences, synthesize):
+        """Queue sentences for synthesis with synthesize(text) -> audio bytes"""
+        with self._lock:
+            generation = self._generation
+        started_at = time.perf_counter()
+        for index, sentence in enumerate(sentences):
+            self._sentences.put((generation, index, started_at, sentence, synthesize))
+
+    def cancel(self):
+        """Drop all queued speech, e.g. when a new user turn starts"""
+        with self._lock:
+            self._generation += 1
+        for q in (self._sentences, self._audio):
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+
+    def _is_current(self, generation):
+        with self._lock:
+            return generation == self._generation
+
+    def _synthesize_worker(self):
+        while True:
+            generation, index, started_at, sentence, synthesize = self._sentences.get()
+            if not self._is_current(generation):
+                continue
+            try:
+                audio = synthesize(sentence)
+            except Exception as e:
+                logger.error(f"Error synthesizing speech: {str(e)}")
+                continue
+            self._audio.put((generation, index, started_at, audio))
+
+    def _playback_worker(self):
+        while True:
+            generation, index, started_at, audio = self._audio.get()
+            if not self._is_current(generation):
+                continue
+            if index == 0:
+                latency.observe("tts.first_audio", time.perf_counter() - started_at)
+            try:
+                play(audio)
+            except Exception as e:
+                logger.error(f"Error playing speech: {str(e)}")
+
+
+_speech_pipeline = None
+_speech_pipeline_lock = threading.Lock()
+
+def get_speech_pipeline():
+    """Return the process-wide speech pipeline, starting its workers on first use"""
+    global _speech_pipeline
+    with _speech_pipeline_lock:
+        if _speech_pipeline is None:
+            _speech_pipeline = SpeechPipeline()
+        return _speech_pipeline
+
+class VoiceActivityDetector:
+    """Frame-level energy VAD with an adaptive noise floor.
+
+    A frame counts as speech when its RMS energy exceeds both an absolute
+    floor and ``ratio`` times the running estimate of background noise.
+    """
+
+    def __init__(self, threshold=0.01, ratio=3.0, noise_alpha=0.05):
+        self.threshold = threshold
+        self.ratio = ratio
+        self.noise_alpha = noise_alpha
+        self.noise_floor = None
+
+    @staticmethod
+    def frame_energy(frame):
+        samples = np.asarray(frame, dtype=np.float32)
+        if np.issubdtype(np.asarray(frame).dtype, np.integer):
+            samples = samples / 32768.0
+        return float(np.sqrt(np.mean(np.square(samples)))) if samples.size else 0.0
+
+    def is_speech(self, frame):
+        energy = self.frame_energy(frame)
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        speech = energy > max(self.threshold, self.noise_floor * self.ratio)
+        if not speech:
+            # Only non-speech frames move the noise estimate
+            self.noise_floor += self.noise_alpha * (energy - self.noise_floor)
+        return speech
+
 class AudioManager:
     def __init__(self):
         try:
             self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
             self.eleven_client = ElevenLabs(api_key=os.getenv('ELEVENLABS_API_KEY'))
+            self.speech_cache = SpeechCache(
+                os.path.join(CACHE_DIR, "speech"),
+                max_bytes=int(os.getenv('SPEECH_CACHE_MAX_MB') or 100) * 1024 * 1024
+            )
+            self._prewarm_started = False
+            self._prewarm_lock = threading.Lock()
             logger.info("AudioManager initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing AudioManager: {str(e)}")
             raise
 
-    def record_audio(self, duration=5, sample_rate=16000):
+    def record_audio(self, duration=5, sample_rate=16000, dtype='int16'):
         """Record audio from microphone"""
         try:
             logger.info("Starting audio recording...")
             recording = sd.rec(int(duration * sample_rate),
                              samplerate=sample_rate,
-                             channels=1)
+                             channels=1,
+                             dtype=dtype)
             sd.wait()
             logger.info("Audio recording completed")
             return recording, sample_rate
@@ -38,6 +185,76 @@ class AudioManager:
             logger.error(f"Error during audio recording: {str(e)}")
             raise
 
+    def record_until_silence(self, sample_rate=16000, max_duration=15, min_duration=0.5,
+                             silence_duration=0.8, pre_roll=0.3, start_timeout=5,
+                             frame_ms=30, vad=None, dtype='int16', on_frame=None):
+        """Record from the microphone until the speaker stops talking.
+
+        Audio is read frame by frame from an input stream. Frames before the
+        first speech are kept in a ``pre_roll`` second ring buffer so word
+        onsets aren't clipped, and recording ends after ``silence_duration``
+        seconds of silence once at least ``min_duration`` seconds of speech
+        were captured, or at ``max_duration``. Returns an empty recording if
+        nobody speaks within ``start_timeout`` seconds. ``on_frame`` is
+        called with every recorded frame as soon as it is captured.
+        """
+        vad = vad or VoiceActivityDetector()
+        frame_size = int(sample_rate * frame_ms / 1000)
+        frames = queue.Queue()
+
+        def callback(indata, frame_count, time_info, status):
+            if status:
+                logger.debug(f"Input stream status: {status}")
+            frames.put(indata.copy())
+
+        pre_roll_frames = deque(maxlen=max(1, int(pre_roll * 1000 / frame_ms)))
+        recorded = []
+        speech_frames = 0
+        silent_frames = 0
+        total_frames = 0
+        max_frames = int(max_duration * 1000 / frame_ms)
+        try:
+            logger.info("Starting voice-activated recording...")
+            with sd.InputStream(samplerate=sample_rate, channels=1, dtype=dtype,
+                                blocksize=frame_size, callback=callback):
+                while total_frames < max_frames:
+                    frame = frames.get(timeout=1)
+                    total_frames += 1
+                    speech = vad.is_speech(frame)
+
+                    if not recorded:
+                        pre_roll_frames.append(frame)
+                        if speech:
+                            recorded.extend(pre_roll_frames)
+                            speech_frames = 1
+                            if on_frame:
+                                for buffered in pre_roll_frames:
+                                    on_frame(buffered)
+                        elif total_frames * frame_ms >= start_timeout * 1000:
+                            logger.info("No speech detected before timeout")
+                            break
+                        continue
+
+                    recorded.append(frame)
+                    if on_frame:
+                        on_frame(frame)
+                    if speech:
+                        speech_frames += 1
+                        silent_frames = 0
+                    else:
+                        silent_frames += 1
+                    if (silent_frames * frame_ms >= silence_duration * 1000
+                            and speech_frames * frame_ms >= min_duration * 1000):
+                        break
+            logger.info(f"Voice-activated recording completed after {total_frames * frame_ms / 1000:.2f}s")
+        except Exception as e:
+            logger.error(f"Error during audio recording: {str(e)}")
+            raise
+
+        if not recorded:
+            return np.zeros((0, 1), dtype=dtype), sample_rate
+        return np.concatenate(recorded), sample_rate
+
     def save_audio(self, recording, sample_rate, filename="temp.wav"):
         """Save recorded audio to file"""
         try:
@@ -49,26 +266,102 @@ class AudioManager:
             logger.error(f"Error saving audio: {str(e)}")
             raise
 
-    def speech_to_text(self, audio_file):
-        """Convert speech to text using Groq Whisper"""
+    def encode_audio(self, recording, sample_rate, format="FLAC"):
+        """Encode a recording as 16-bit FLAC (or WAV) in memory and return the bytes"""
+        buffer = io.BytesIO()
+        sf.write(buffer, recording, sample_rate, format=format, subtype='PCM_16')
+        audio_bytes = buffer.getvalue()
+        logger.info(f"Encoded {len(recording) / sample_rate:.2f}s of audio as {format} ({len(audio_bytes)} bytes)")
+        return audio_bytes
+
+    def speech_to_text(self, audio, filename="speech.flac"):
+        """Convert speech to text using Groq Whisper.
+
+        ``audio`` is either encoded audio bytes (see ``encode_audio``), sent
+        straight from memory as ``filename``, or a path to an audio file.
+        """
         try:
             logger.info("Starting speech to text conversion")
-            with open(audio_file, "rb") as file:
+            if isinstance(audio, (bytes, bytearray)):
                 transcript = self.groq_client.audio.transcriptions.create(
                     model="whisper-large-v3-turbo",
-                    file=file
+                    file=(filename, bytes(audio))
                 )
+            else:
+                with open(audio, "rb") as file:
+                    transcript = self.groq_client.audio.transcriptions.create(
+                        model="whisper-large-v3-turbo",
+                        file=file
+                    )
             logger.info("Speech to text conversion completed")
             return transcript.text
         except Exception as e:
             logger.error(f"Error in speech to text conversion: {str(e)}")
             raise
 
-    def text_to_speech(self, text):
-        """Convert text to speech using ElevenLabs"""
+    def transcribe_chunk(self, recording, sample_rate):
+        """Transcribe a slice of a recording held in memory"""
+        return self.speech_to_text(self.encode_audio(recording, sample_rate))
+
+    def listen_and_transcribe(self, on_partial=None, chunk_seconds=4.0, overlap_seconds=1.0,
+                              sample_rate=16000, **record_kwargs):
+        """Record until silence while transcribing overlapping chunks as they fill.
+
+        ``on_partial`` receives the stitched interim transcript. Returns the
+        final transcript, or "" if nobody spoke.
+        """
+        transcriber = StreamingTranscriber(self.transcribe_chunk, sample_rate, chunk_seconds,
+                                           overlap_seconds, on_partial)
+        try:
+            recording, _ = self.record_until_silence(sample_rate=sample_rate,
+                                                     on_frame=transcriber.feed, **record_kwargs)
+        except Exception:
+            transcriber.cancel()
+            raise
+        if not len(recording):
+            transcriber.cancel()
+            return ""
+        return transcriber.finish()
+
+    def synthesize(self, text):
+        """Return encoded audio for text, from the speech cache when possible"""
+        return self.speech_cache.get_or_synthesize(text, TTS_VOICE, TTS_MODEL, self._synthesize_remote)
+
+    def _synthesize_remote(self, text):
+        """Synthesize text with ElevenLabs and return the encoded audio bytes"""
         audio = self.eleven_client.generate(
             text=text,
-            voice="Daniel",
-            model="eleven_multilingual_v2"
+            voice=TTS_VOICE,
+            model=TTS_MODEL
         )
-        play(audio)
\ No newline at end of file
+        return audio if isinstance(audio, bytes) else b"".join(audio)
+
+    def prewarm_speech(self, phrases):
+        """Synthesize any of the given phrases missing from the cache, once per process"""
+        with self._prewarm_lock:
+            if self._prewarm_started:
+                return
+            self._prewarm_started = True
+        missing = [p for p in phrases if not self.speech_cache.contains(p, TTS_VOICE, TTS_MODEL)]
+        for phrase in missing:
+            try:
+                self.synthesize(phrase)
+            except Exception as e:
+                logger.error(f"Error pre-warming speech for '{phrase}': {str(e)}")
+                return
+        logger.info(f"Speech cache pre-warmed: {len(missing)} of {len(phrases)} phrases synthesized")
+
+    def text_to_speech(self, text, pipelined=True):
+        """Convert text to speech using ElevenLabs.
+
+        In pipelined mode the text is spoken sentence by sentence on a
+        background worker and this call returns immediately.
+        """
+        if not pipelined:
+            play(self.synthesize(text))
+            return
+        get_speech_pipeline().speak(split_sentences(text), self.synthesize)
+
+    def stop_speech(self):
+        """Cancel any queued speech from a previous turn"""
+        get_speech_pipeline().cancel()
\ No newline at end of file
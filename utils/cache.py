@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Where on-disk caches (music lookups, synthesized speech, ...) are kept
+CACHE_DIR = os.getenv('VELOCE_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'veloce_ai')
+
+# Shared by every cache so a burst of stale entries cannot spawn unbounded threads
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+class TTLCache:
+    """Thread-safe LRU cache with a time-to-live and stale-while-revalidate.
+
+    Entries younger than ``ttl`` are served directly. Entries older than
+    ``ttl`` but younger than ``ttl + stale_ttl`` are served immediately while
+    a background thread reloads them, so callers never wait on a refresh.
+    Anything older is treated as a miss and loaded synchronously; concurrent
+    misses for the same key share a single load.
+    """
+
+    def __init__(self, name, ttl, max_size=128, stale_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._refreshing = set()
+        self._inflight = {}  # key -> Future for loads in progress
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0,
+                       'refreshes': 0, 'refresh_errors': 0, 'evictions': 0}
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() when needed.
+
+        ``None`` results are never cached so failed lookups are retried.
+        """
+        now = time.monotonic()
+        owner = False
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age <= self.ttl:
+                    self._data.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                if age <= self.ttl + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    self._stats['stale_hits'] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        _refresh_executor.submit(self._refresh, key, loader)
+                    return value
+                del self._data[key]
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self._stats['coalesced'] += 1
+            else:
+                self._stats['misses'] += 1
+                inflight = self._inflight[key] = Future()
+                owner = True
+        if not owner:
+            return inflight.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.set_exception(e)
+            raise
+        if value is not None:
+            self.set(key, value)
+        with self._lock:
+            self._inflight.pop(key, None)
+        inflight.set_result(value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+            with self._lock:
+                self._stats['refreshes'] += 1
+        except Exception as e:
+            # Keep serving the stale value; the next stale hit retries
+            logger.error(f"Error refreshing {self.name} cache entry {key!r}: {str(e)}")
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key, default=None):
+        """Return a fresh cached value without loading"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                return default
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+        served = stats['hits'] + stats['stale_hits'] + stats['coalesced']
+        lookups = served + stats['misses']
+        stats['hit_rate'] = served / lookups if lookups else 0.0
+        return stats
+
+    def save(self, path):
+        """Write unexpired entries to a JSON file (keys and values must be JSON-safe)"""
+        now_mono, now_wall = time.monotonic(), time.time()
+        with self._lock:
+            entries = [[key, value, now_wall - (now_mono - stored_at)]
+                       for key, (value, stored_at) in self._data.items()
+                       if now_mono - stored_at <= self.ttl + self.stale_ttl]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Load entries written by save(), keeping their original age"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading {self.name} cache from {path}: {str(e)}")
+            return 0
+        now_mono, now_wall = time.monotonic(), time.time()
+        loaded = 0
+        with self._lock:
+            for key, value, stored_wall in entries:
+                age = now_wall - stored_wall
+                if age <= self.ttl + self.stale_ttl and key not in self._data:
+                    self._data[key] = (value, now_mono - age)
+                    loaded += 1
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return loaded
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(name, ttl, max_size=128, stale_ttl=0):
+    """Return the process-wide cache called name, creating it on first use"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = TTLCache(name, ttl, max_size=max_size, stale_ttl=stale_ttl)
+            _caches[name] = cache
+        return cache
+
+def cache_stats():
+    """Hit/miss counters for every registered cache, keyed by name"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.get_stats() for cache in caches}
@@ -0,0 +1,81 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from utils.metrics import latency
+
+logger = logging.getLogger(__name__)
+
+# Seconds each source may take before its fallback is used
+DEFAULT_DEADLINES = {
+    'vehicle': 3.0,
+    'location': 1.5,
+    'city': 1.5,
+    'weather': 1.5,
+}
+
+DEFAULT_WEATHER = {
+    'temperature': 0,
+    'humidity': 0,
+    'description': "Unknown",
+    'wind_speed': 0,
+}
+
+# Shared across reruns and sessions; slow calls that miss their deadline keep
+# running here and usually warm the lookup caches for the next rerun
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="context")
+
+def _await(name, future, deadline, started_at, default=None):
+    try:
+        result = future.result(timeout=deadline)
+    except TimeoutError:
+        logger.warning(f"{name} lookup missed its {deadline}s deadline, using fallback")
+        return default
+    except Exception as e:
+        logger.error(f"Error in {name} lookup: {str(e)}")
+        return default
+    latency.observe(f"context.{name}", time.perf_counter() - started_at)
+    return default if result is None else result
+
+def assemble_context(load_vehicle, get_location, get_city, get_weather, deadlines=None):
+    """Run the independent context lookups concurrently.
+
+    The vehicle row is fetched alongside the location -> city -> weather
+    chain, so the total wait is the slower of the two branches rather than
+    the sum of all four calls. Each source has its own deadline and falls
+    back to "Unknown" style defaults when it is slow or fails.
+
+    Returns a dict with ``vehicle``, ``location`` (lat/lon dict or None),
+    ``current_location``, ``current_city`` and ``weather``.
+    """
+    deadlines = {**DEFAULT_DEADLINES, **(deadlines or {})}
+    started_at = time.perf_counter()
+    vehicle_future = _executor.submit(load_vehicle)
+
+    location = _await('location', _executor.submit(get_location),
+                      deadlines['location'], started_at)
+    current_city = None
+    if location:
+        stage_start = time.perf_counter()
+        city = _await('city', _executor.submit(get_city, location['latitude'], location['longitude']),
+                      deadlines['city'], stage_start)
+        if city:
+            current_city = city.split()[0]  # Take only first word
+
+    weather = None
+    if current_city:
+        stage_start = time.perf_counter()
+        weather = _await('weather', _executor.submit(get_weather, current_city),
+                         deadlines['weather'], stage_start)
+
+    # The vehicle deadline counts from the start, it has been running all along
+    remaining = max(0.0, deadlines['vehicle'] - (time.perf_counter() - started_at))
+    vehicle = _await('vehicle', vehicle_future, remaining, started_at)
+    latency.observe("context.total", time.perf_counter() - started_at)
+
+    return {
+        'vehicle': vehicle,
+        'location': location,
+        'current_location': f"{location['latitude']}, {location['longitude']}" if location else "Unknown",
+        'current_city': current_city or "Unknown",
+        'weather': weather or dict(DEFAULT_WEATHER),
+    }
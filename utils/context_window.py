@@ -0,0 +1,115 @@
+import hashlib
+import math
+
+# Rough cost of one image part for the vision model
+IMAGE_TOKENS = 1000
+# Role markers and separators the chat template adds around each message
+MESSAGE_OVERHEAD = 4
+
+def count_text_tokens(text):
+    """Estimate tokens in text (~4 characters per token for English)"""
+    return math.ceil(len(text) / 4)
+
+def message_text(message):
+    content = message["content"]
+    if isinstance(content, list):
+        return " ".join(c["text"] for c in content if c["type"] == "text")
+    return str(content)
+
+def count_message_tokens(message):
+    content = message["content"]
+    tokens = MESSAGE_OVERHEAD + count_text_tokens(message_text(message))
+    if isinstance(content, list):
+        tokens += IMAGE_TOKENS * sum(1 for c in content if c["type"] == "image_url")
+    return tokens
+
+def _message_key(message):
+    return hashlib.sha1(f"{message['role']}:{message_text(message)}".encode()).hexdigest()
+
+def _summarize_extractive(messages, max_chars=160):
+    """One line per message: the role and the start of its text"""
+    lines = []
+    for message in messages:
+        text = " ".join(message_text(message).split())
+        if len(text) > max_chars:
+            text = text[:max_chars].rsplit(" ", 1)[0] + "..."
+        if text:
+            lines.append(f"- {message['role']}: {text}")
+    return lines
+
+class ContextWindow:
+    """Fits a conversation into a prompt token budget.
+
+    The leading system prompt and any system messages added for the current
+    turn (e.g. search results) are always sent. The remaining budget is
+    filled with the most recent turns; older turns are folded into a running
+    summary that is only extended with newly dropped turns, so it is not
+    rebuilt on every request. Keep one instance per conversation.
+    """
+
+    def __init__(self, budget=6000, summary_tokens=400, summarize=None):
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize or _summarize_extractive
+        self._summary_lines = []
+        self._summarized = 0
+        self._last_summarized_key = None
+        self.last_prompt_tokens = 0
+
+    def build(self, messages):
+        """Return (messages_to_send, prompt_tokens)"""
+        primary = [messages[0]] if messages and messages[0]["role"] == "system" else []
+        rest = messages[len(primary):]
+
+        last_user = max((i for i, m in enumerate(rest) if m["role"] == "user"), default=-1)
+        # Older injected system messages were context for turns already answered
+        turns = [m for m in rest[:last_user + 1] if m["role"] != "system"]
+        trailing = rest[last_user + 1:]
+
+        fixed = primary + trailing
+        used = sum(count_message_tokens(m) for m in fixed)
+        turn_tokens = [count_message_tokens(m) for m in turns]
+
+        if used + sum(turn_tokens) <= self.budget:
+            kept_from = 0
+        else:
+            available = self.budget - used - self.summary_tokens
+            kept_from = len(turns)
+            # Always keep the current user message, even if it alone is over budget
+            while kept_from > 0 and (kept_from == len(turns) or turn_tokens[kept_from - 1] <= available):
+                kept_from -= 1
+                available -= turn_tokens[kept_from]
+
+        window = list(primary)
+        summary = self._update_summary(turns[:kept_from])
+        if summary:
+            window.append({"role": "system",
+                           "content": f"Summary of the earlier conversation:\n{summary}"})
+        window += turns[kept_from:] + trailing
+
+        self.last_prompt_tokens = sum(count_message_tokens(m) for m in window)
+        return window, self.last_prompt_tokens
+
+    def _update_summary(self, dropped):
+        if not dropped:
+            return ""
+        # Start over if the history was rewritten underneath us
+        if (len(dropped) < self._summarized
+                or (self._summarized and _message_key(dropped[self._summarized - 1]) != self._last_summarized_key)):
+            self._summary_lines = []
+            self._summarized = 0
+
+        if len(dropped) > self._summarized:
+            self._summary_lines += self.summarize(dropped[self._summarized:])
+            self._summarized = len(dropped)
+            self._last_summarized_key = _message_key(dropped[-1])
+
+        # Keep the newest lines that fit the summary budget
+        lines, tokens = [], 0
+        for line in reversed(self._summary_lines):
+            tokens += count_text_tokens(line) + 1
+            if tokens > self.summary_tokens:
+                break
+            lines.append(line)
+        self._summary_lines = lines[::-1]
+        return "\n".join(self._summary_lines)
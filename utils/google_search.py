@@ -1,23 +1,63 @@
 # google_search.py
 from googleapiclient.discovery import build
 import os
+import re
+import threading
+from utils.cache import get_cache
+
+STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "of", "in", "on", "for", "to",
+    "and", "or", "me", "please", "can", "you", "could", "tell", "about", "what's",
+    "whats", "what", "do", "does", "i", "my", "hey", "veloce",
+})
+
+def normalize_query(query):
+    """Cache key for a query: lowercase, punctuation stripped, stopwords removed"""
+    words = re.findall(r"[\w'.+-]+", query.lower())
+    kept = [w.strip(".") for w in words if w not in STOPWORDS]
+    kept = [w for w in kept if w]
+    return " ".join(kept) or " ".join(words)
 
 class GoogleSearchClient:
-    def __init__(self):
+    def __init__(self, cache_ttl=1800, cache_size=512, cache_path=None):
         self.api_key = os.getenv('GOOGLE_API_KEY')
         self.cse_id = os.getenv('GOOGLE_CSE_ID')
         self.service = build('customsearch', 'v1', developerKey=self.api_key)
+        # The client is shared across sessions and httplib2 is not thread-safe
+        self._lock = threading.Lock()
+        self.api_calls = 0
+        self._unsaved = False
+        # Identical in-flight queries share one API call (see TTLCache.get_or_load)
+        self.cache = get_cache("google_search", ttl=cache_ttl, max_size=cache_size)
+        self.cache_path = cache_path or os.getenv('GOOGLE_SEARCH_CACHE_PATH')
+        if self.cache_path:
+            self.cache.load(self.cache_path)
 
     def search(self, query, num_results=3):
+        key = f"{num_results}:{normalize_query(query)}"
+        results = self.cache.get_or_load(key, lambda: self._search_api(query, num_results))
+        if self._unsaved and self.cache_path:
+            self._unsaved = False
+            try:
+                self.cache.save(self.cache_path)
+            except OSError as e:
+                print(f"Google Search cache save error: {str(e)}")
+        return results if results is not None else []
+
+    def _search_api(self, query, num_results):
+        """Call the Custom Search API; returns None on errors so they aren't cached"""
         try:
-            result = self.service.cse().list(
-                q=query,
-                cx=self.cse_id,
-                num=num_results
-            ).execute()
+            with self._lock:
+                self.api_calls += 1
+                result = self.service.cse().list(
+                    q=query,
+                    cx=self.cse_id,
+                    num=num_results
+                ).execute()
 
+            results = []
             if 'items' in result:
-                return [
+                results = [
                     {
                         'title': item['title'],
                         'snippet': item['snippet'],
@@ -25,7 +65,16 @@ class GoogleSearchClient:
                     }
                     for item in result['items']
                 ]
-            return []
         except Exception as e:
             print(f"Google Search error: {str(e)}")
-            return []
\ No newline at end of file
+            return None
+
+        self._unsaved = True
+        return results
+
+    def get_stats(self):
+        """Cache hit rate and the number of API calls (paid quota) avoided"""
+        stats = self.cache.get_stats()
+        stats['api_calls'] = self.api_calls
+        stats['quota_saved'] = stats['hits'] + stats['stale_hits'] + stats['coalesced']
+        return stats
\ No newline at end of file
@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# The vision model tiles images at 560px; anything larger only costs upload time
+MAX_IMAGE_SIDE = 1120
+JPEG_QUALITY = 85
+
+class ImageStore:
+    """Process-wide store of normalized images keyed by content hash.
+
+    Uploads are decoded, downscaled to ``max_side`` and re-encoded as JPEG
+    once. Messages then carry only the short hash; the base64 data URL is
+    built when a request is sent.
+    """
+
+    def __init__(self, max_images=64, max_side=MAX_IMAGE_SIDE, quality=JPEG_QUALITY):
+        self.max_images = max_images
+        self.max_side = max_side
+        self.quality = quality
+        self._images = OrderedDict()  # image hash -> JPEG bytes
+        self._uploads = {}  # hash of raw upload -> image hash
+        self._lock = threading.Lock()
+
+    def ingest(self, raw_bytes):
+        """Normalize an uploaded image and return its content hash"""
+        upload_key = hashlib.sha256(raw_bytes).hexdigest()
+        with self._lock:
+            image_hash = self._uploads.get(upload_key)
+            if image_hash in self._images:
+                # Streamlit hands us the same upload on every rerun
+                self._images.move_to_end(image_hash)
+                return image_hash
+
+        from PIL import Image, ImageOps  # Imported on first upload to keep startup fast
+
+        image = Image.open(io.BytesIO(raw_bytes))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+        jpeg = buffer.getvalue()
+        image_hash = hashlib.sha256(jpeg).hexdigest()[:32]
+        logger.info(f"Ingested image {image_hash}: {len(raw_bytes)} -> {len(jpeg)} bytes, {image.size}")
+
+        with self._lock:
+            self._images[image_hash] = jpeg
+            self._images.move_to_end(image_hash)
+            self._uploads[upload_key] = image_hash
+            while len(self._images) > self.max_images:
+                evicted, _ = self._images.popitem(last=False)
+                self._uploads = {k: v for k, v in self._uploads.items() if v != evicted}
+        return image_hash
+
+    def get_bytes(self, image_hash):
+        with self._lock:
+            return self._images.get(image_hash)
+
+    def data_url(self, image_hash):
+        """Build the base64 data URL for an image, or None if it was evicted"""
+        jpeg = self.get_bytes(image_hash)
+        if jpeg is None:
+            return None
+        return f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('utf-8')}"
+
+
+image_store = ImageStore()
+
+def image_ref(image_hash):
+    """Message content part that refers to a stored image"""
+    return {"type": "image_ref", "image_hash": image_hash}
+
+def resolve_image_ref(part):
+    """Turn an image_ref part into the image_url part the Groq API expects"""
+    url = image_store.data_url(part["image_hash"])
+    if url is None:
+        return None
+    return {"type": "image_url", "image_url": {"url": url}}
@@ -0,0 +1,197 @@
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# Intents in priority order. Each keyword carries a weight used for the
+# confidence score; phrases are matched on word boundaries only.
+INTENT_KEYWORDS: List[Tuple[str, Dict[str, float]]] = [
+    ("sos", {"sos": 1.0, "emergency": 0.9, "call police": 1.0, "call the police": 1.0,
+             "accident": 0.8, "danger": 0.7, "help": 0.6}),
+    ("lights", {"lights": 0.9, "light": 0.8, "headlights": 0.9}),
+    ("doors", {"unlock": 0.9, "lock": 0.9, "doors": 0.8, "door": 0.8}),
+    ("engine", {"engine": 0.9, "start": 0.7, "stop": 0.6}),
+    ("music", {"play": 0.8, "music": 0.9, "song": 0.9, "songs": 0.9}),
+    ("info", {"who is": 0.8, "what is": 0.7, "current": 0.5, "latest": 0.7,
+              "news about": 0.9, "tell me about": 0.8}),
+]
+
+DEFAULT_INTENT = "chat"
+
+# Intents sharing a band compete on confidence ("stop the music" is music,
+# not engine); a lower band always wins over a higher one.
+PRIORITY_BANDS = {"sos": 0, "lights": 1, "doors": 1, "engine": 1, "music": 1, "info": 2}
+
+# A bare "help" is always an emergency, except right before these words,
+# where it's asking for assistance with something else
+NON_EMERGENCY_HELP = [("help", "me", "find"), ("help", "me", "with"), ("help", "with"),
+                      ("help", "me", "play"), ("help", "me", "choose"), ("help", "me", "pick"),
+                      ("help", "me", "understand")]
+
+@dataclass(frozen=True)
+class IntentMatch:
+    intent: str
+    confidence: float
+    keywords: Tuple[str, ...] = field(default_factory=tuple)
+
+class IntentRouter:
+    """Classifies an utterance in a single pass over its words.
+
+    The text is tokenized once and every keyword phrase is looked up in a
+    dict keyed by word tuples (longest phrase first), so matches only ever
+    land on whole words. A "help" followed by ``NON_EMERGENCY_HELP`` words
+    is skipped. The winner comes from the best matched priority band and,
+    within it, has the highest confidence, which combines the weights of
+    the intent's matched keywords as ``1 - prod(1 - w)``.
+    """
+
+    _TOKEN = re.compile(r"[a-z0-9']+")
+
+    def __init__(self, intents=None, default=DEFAULT_INTENT, bands=None, skip=None):
+        self.intents = intents or INTENT_KEYWORDS
+        self.default = default
+        bands = PRIORITY_BANDS if bands is None else bands
+        # (band, list position) so ties keep the declared order
+        self._priority = {name: (bands.get(name, rank), rank) for rank, (name, _) in enumerate(self.intents)}
+        self._skip = set(NON_EMERGENCY_HELP if skip is None else skip)
+        self._skip_lengths = sorted({len(phrase) for phrase in self._skip}, reverse=True)
+        self._skip_heads = {phrase[0] for phrase in self._skip}
+        self._phrases = {}
+        for name, words in self.intents:
+            for keyword, weight in words.items():
+                self._phrases[tuple(keyword.split())] = (name, keyword, weight)
+        self._lengths = sorted({len(phrase) for phrase in self._phrases}, reverse=True)
+
+    def classify(self, text):
+        """Return the IntentMatch for text, or the default intent when nothing matches"""
+        tokens = self._TOKEN.findall(text.lower())
+        phrases = self._phrases
+        hits = {}
+        i = 0
+        while i < len(tokens):
+            if tokens[i] in self._skip_heads and any(tuple(tokens[i:i + length]) in self._skip
+                                                     for length in self._skip_lengths):
+                i += 1  # Drop the "help" only; the words after it still count
+                continue
+            for length in self._lengths:
+                hit = phrases.get(tuple(tokens[i:i + length]))
+                if hit is not None:
+                    hits.setdefault(hit[0], []).append(hit)
+                    i += length
+                    break
+            else:
+                i += 1
+        if not hits:
+            return IntentMatch(self.default, 0.0)
+        best = None
+        for name, matched in hits.items():
+            miss = 1.0
+            for _, _, weight in matched:
+                miss *= 1.0 - weight
+            confidence = round(1.0 - miss, 3)
+            band, rank = self._priority[name]
+            rank_key = (band, -confidence, rank)
+            if best is None or rank_key < best[0]:
+                best = (rank_key, name, confidence, matched)
+        _, name, confidence, matched = best
+        return IntentMatch(name, confidence, tuple(keyword for _, keyword, _ in matched))
+
+
+router = IntentRouter()
+
+def classify_intent(text):
+    """Classify text with the shared router"""
+    return router.classify(text)
+
+def text_after_keyword(text, keyword):
+    """The part of text after the first whole-word occurrence of keyword"""
+    parts = re.split(rf"\b{re.escape(keyword)}\b", text, maxsplit=1, flags=re.IGNORECASE)
+    return parts[1].strip() if len(parts) > 1 else text
+
+
+# Labelled utterances used to track routing accuracy
+LABELLED_CORPUS = [
+    ("SOS! I need help now", "sos"),
+    ("there has been an accident on the highway", "sos"),
+    ("call police please", "sos"),
+    ("this is an emergency", "sos"),
+    ("help, there has been an accident", "sos"),
+    ("help me", "sos"),
+    ("help!", "sos"),
+    ("I need help", "sos"),
+    ("I am in danger", "sos"),
+    ("danger", "sos"),
+    ("can you help me find a song", "music"),
+    ("can you help with the navigation settings", "chat"),
+    ("is it dangerous to drive in fog", "chat"),
+    ("turn on the lights", "lights"),
+    ("switch the headlights off", "lights"),
+    ("lock the doors", "doors"),
+    ("please unlock the car doors", "doors"),
+    ("is the door locked", "doors"),
+    ("start the engine", "engine"),
+    ("stop the engine", "engine"),
+    ("turn the engine off", "engine"),
+    ("stop the music", "music"),
+    ("play bohemian rhapsody", "music"),
+    ("play some music", "music"),
+    ("find me a song by coldplay", "music"),
+    ("who is the CEO of Volkswagen", "info"),
+    ("what is the latest news about electric cars", "info"),
+    ("tell me about the ID.4", "info"),
+    ("that was really helpful, thanks", "chat"),
+    ("should I restart my phone", "chat"),
+    ("how are you today", "chat"),
+    ("is it a good day for a drive", "chat"),
+    ("the display is too dangerous to read while driving", "chat"),
+    ("I love the playlist feature", "chat"),
+    ("remind me to book a service", "chat"),
+]
+
+def _legacy_classify(text):
+    """The substring-scan chain process_ai_response used before the router"""
+    text = text.lower()
+    if any(t in text for t in ["sos", "emergency", "help", "call police", "danger", "accident"]):
+        return "sos"
+    if any(w in text for w in ["light", "lights"]):
+        return "lights"
+    if any(w in text for w in ["lock", "unlock", "door"]):
+        return "doors"
+    if any(w in text for w in ["engine", "start", "stop"]):
+        return "engine"
+    if any(w in text for w in ["play", "music", "song"]):
+        return "music"
+    if any(k in text for k in ['who is', 'what is', 'current', 'latest', 'news about', 'tell me about']):
+        return "info"
+    return DEFAULT_INTENT
+
+def evaluate(classify=None, corpus=LABELLED_CORPUS):
+    """Return (accuracy, misclassified) for a classifier over the labelled corpus"""
+    classify = classify or (lambda text: router.classify(text).intent)
+    misclassified = [(text, expected, classify(text))
+                     for text, expected in corpus
+                     if classify(text) != expected]
+    return 1 - len(misclassified) / len(corpus), misclassified
+
+def benchmark(iterations=2000, corpus=LABELLED_CORPUS):
+    """Mean microseconds per utterance for the router and the legacy chain"""
+    texts = [text for text, _ in corpus]
+    results = {}
+    for label, classify in (("router", router.classify), ("legacy", _legacy_classify)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for text in texts:
+                classify(text)
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed / (iterations * len(texts)) * 1e6
+    return results
+
+
+if __name__ == "__main__":
+    for label, classify in (("router", None), ("legacy", _legacy_classify)):
+        accuracy, misses = evaluate(classify)
+        print(f"{label}: accuracy {accuracy:.1%}")
+        for text, expected, got in misses:
+            print(f"  {text!r}: expected {expected}, got {got}")
+    for label, micros in benchmark().items():
+        print(f"{label}: {micros:.2f} us/utterance")
@@ -0,0 +1,283 @@
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from utils.metrics import latency, usage
+
+logger = logging.getLogger(__name__)
+
+# Model a hedged request goes to when the primary is slow or failing
+ALTERNATE_MODELS = {
+    "llama3-70b-8192": "llama-3.1-8b-instant",
+    "llama-3.2-11b-vision-preview": "llama-3.2-90b-vision-preview",
+}
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+class LLMError(Exception):
+    """Raised when no model produced an answer within the deadline"""
+
+class _Cancelled(Exception):
+    pass
+
+def _is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    # Connection failures and timeouts carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "TimeoutError")
+
+class LLMClient:
+    """Chat completions with deadlines, retries and hedged requests.
+
+    Each attempt gets its own timeout and the SDK's built-in retries are
+    turned off; retryable failures (timeouts, 429, 5xx) are retried here
+    with full-jitter exponential backoff until the call's deadline. If the
+    primary model hasn't answered (or, when streaming, produced its first
+    token) after its recent p95 latency, a second request goes to the
+    alternate model. The first to answer wins and the other is cancelled.
+    Once a stream has a winner the overall deadline no longer applies;
+    instead each chunk must arrive within ``attempt_timeout``. Time to
+    first token and total time are recorded per model, and a cancelled
+    loser records the time it had been waiting, so a model that keeps
+    losing hedges still pushes its own percentiles (and hedge delay) up.
+    """
+
+    def __init__(self, get_client, alternates=None, deadline=30.0, attempt_timeout=15.0,
+                 max_attempts=3, backoff=0.5, hedge_percentile=95, default_hedge_delay=3.0,
+                 min_hedge_delay=0.5, min_samples=20, max_workers=16):
+        self.get_client = get_client
+        self.alternates = ALTERNATE_MODELS if alternates is None else alternates
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def hedge_delay(self, model, stage):
+        """Seconds to wait for model before hedging, from its recent latency at stage"""
+        name = f"llm.{model}.{stage}"
+        if latency.summary(name).get('count', 0) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, latency.percentile(name, self.hedge_percentile))
+
+    def _create(self, model, messages, timeout, **params):
+        client = self.get_client().with_options(timeout=timeout, max_retries=0)
+        return client.chat.completions.create(model=model, messages=messages, **params)
+
+    def _retry_delay(self, model, attempt, error, deadline_at, cancelled):
+        """Sleep before the next attempt, or re-raise if it shouldn't be retried"""
+        usage.observe(f"llm.{model}.errors", 1)
+        if attempt == self.max_attempts or not _is_retryable(error):
+            raise error
+        delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+        if time.monotonic() + delay >= deadline_at:
+            raise error
+        logger.warning(f"{model} attempt {attempt} failed ({error}), retrying in {delay:.2f}s")
+        usage.observe(f"llm.{model}.retries", 1)
+        if cancelled.wait(delay):
+            raise _Cancelled()
+
+    def _attempt_timeout(self, deadline_at):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM deadline exceeded")
+        return min(self.attempt_timeout, remaining)
+
+    def _complete_one(self, model, messages, params, deadline_at, cancelled):
+        start = time.perf_counter()
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                if cancelled.is_set():
+                    raise _Cancelled()
+                try:
+                    response = self._create(model, messages, self._attempt_timeout(deadline_at), **params)
+                    text = response.choices[0].message.content
+                    latency.observe(f"llm.{model}.total", time.perf_counter() - start)
+                    return text
+                except _Cancelled:
+                    raise
+                except Exception as e:
+                    self._retry_delay(model, attempt, e, deadline_at, cancelled)
+        except _Cancelled:
+            # Lost to the hedge: the wait so far is a lower bound on this model's latency
+            latency.observe(f"llm.{model}.total", time.perf_counter() - start)
+            raise
+
+    def complete(self, model, messages, **params):
+        """Return the full response text, hedging to the alternate model if needed"""
+        deadline_at = time.monotonic() + self.deadline
+        hedge_at = time.monotonic() + self.hedge_delay(model, 'total')
+        alternate = self.alternates.get(model)
+        calls = {}  # future -> (model, cancelled event)
+
+        def launch(name):
+            cancelled = threading.Event()
+            future = self._executor.submit(self._complete_one, name, messages, params, deadline_at, cancelled)
+            calls[future] = (name, cancelled)
+            return future
+
+        launch(model)
+        pending = set(calls)
+        errors = []
+        try:
+            while True:
+                hedge_pending = alternate and len(calls) == 1
+                wake_at = hedge_at if hedge_pending else deadline_at
+                done, pending = wait(pending, timeout=max(0.0, wake_at - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        errors.append(f"{calls[future][0]}: {e}")
+                        continue
+                    name = calls[future][0]
+                    if name != model:
+                        usage.observe(f"llm.{model}.hedge_wins", 1)
+                    return text
+
+                # Hedge when the primary is slow, or straight away if it already failed
+                if hedge_pending and (time.monotonic() >= hedge_at or not pending):
+                    logger.info(f"{model} is slow or failing, hedging with {alternate}")
+                    usage.observe(f"llm.{model}.hedges", 1)
+                    # Added even if already done, so a fast answer isn't skipped
+                    pending.add(launch(alternate))
+                    continue
+                if not pending or time.monotonic() >= deadline_at:
+                    raise LLMError(f"No response from {model}: {'; '.join(errors) or 'deadline exceeded'}")
+        finally:
+            for _, cancelled in calls.values():
+                cancelled.set()
+
+    def _stream_one(self, model, messages, params, deadline_at, cancelled, events):
+        """Push (model, kind, value) events for one streamed response onto events"""
+        start = time.perf_counter()
+        emitted = False
+
+        def give_up():
+            # Cancelled before its first token: record the wait as a lower bound
+            if not emitted:
+                latency.observe(f"llm.{model}.ttft", time.perf_counter() - start)
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                stream = self._create(model, messages, self._attempt_timeout(deadline_at),
+                                      stream=True, **params)
+                try:
+                    for chunk in stream:
+                        if cancelled.is_set():
+                            give_up()
+                            return
+                        if not chunk.choices:
+                            continue
+                        token = chunk.choices[0].delta.content
+                        if token:
+                            if not emitted:
+                                emitted = True
+                                latency.observe(f"llm.{model}.ttft", time.perf_counter() - start)
+                            events.put((model, 'token', token))
+                finally:
+                    stream.close()
+                latency.observe(f"llm.{model}.total", time.perf_counter() - start)
+                events.put((model, 'done', None))
+                return
+            except Exception as e:
+                if cancelled.is_set():
+                    give_up()
+                    return
+                try:
+                    if emitted:
+                        # Part of the answer is already on screen, it can't be replayed
+                        raise e
+                    self._retry_delay(model, attempt, e, deadline_at, cancelled)
+                except _Cancelled:
+                    give_up()
+                    return
+                except Exception as final:
+                    events.put((model, 'error', final))
+                    return
+
+    def stream(self, model, messages, **params):
+        """Yield response tokens, hedging to the alternate model before the first token"""
+        deadline_at = time.monotonic() + self.deadline
+        hedge_at = time.monotonic() + self.hedge_delay(model, 'ttft')
+        alternate = self.alternates.get(model)
+        events = queue.Queue()
+        calls = {}  # model -> cancelled event
+        failed = []
+        winner = None
+        last_chunk_at = None
+
+        def launch(name):
+            calls[name] = threading.Event()
+            self._executor.submit(self._stream_one, name, messages, params, deadline_at, calls[name], events)
+
+        launch(model)
+        try:
+            while True:
+                hedge_pending = winner is None and alternate and alternate not in calls
+                if winner is not None:
+                    wake_at = last_chunk_at + self.attempt_timeout
+                else:
+                    wake_at = hedge_at if hedge_pending else deadline_at
+                try:
+                    name, kind, value = events.get(timeout=max(0.0, wake_at - time.monotonic()))
+                except queue.Empty:
+                    if winner is not None:
+                        raise LLMError(f"{winner} stream stalled for {self.attempt_timeout}s")
+                    if hedge_pending and time.monotonic() >= hedge_at:
+                        logger.info(f"No first token from {model} yet, hedging with {alternate}")
+                        usage.observe(f"llm.{model}.hedges", 1)
+                        launch(alternate)
+                        continue
+                    if time.monotonic() >= deadline_at:
+                        raise LLMError(f"No response from {model} within {self.deadline}s")
+                    continue
+
+                if winner is None and kind in ('token', 'done'):
+                    winner = name
+                    for other, cancelled in calls.items():
+                        if other != winner:
+                            cancelled.set()
+                    if winner != model:
+                        usage.observe(f"llm.{model}.hedge_wins", 1)
+                if winner is None:
+                    # kind == 'error' before any model answered
+                    failed.append(f"{name}: {value}")
+                    if hedge_pending:
+                        usage.observe(f"llm.{model}.hedges", 1)
+                        launch(alternate)
+                    elif len(failed) == len(calls):
+                        raise LLMError(f"No response from {model}: {'; '.join(failed)}")
+                    continue
+                if name != winner:
+                    continue
+                if kind == 'token':
+                    yield value
+                    # Time spent in the consumer doesn't count as the stream being idle
+                    last_chunk_at = time.monotonic()
+                elif kind == 'done':
+                    return
+                else:
+                    raise LLMError(f"{winner} stream interrupted: {value}")
+        finally:
+            for cancelled in calls.values():
+                cancelled.set()
+
+    def latency_report(self):
+        """Per-model summaries and histograms of time to first token and total time"""
+        report = {}
+        for name, summary in latency.snapshot().items():
+            parts = name.split(".")
+            if len(parts) < 3 or parts[0] != "llm" or parts[-1] not in ('ttft', 'total'):
+                continue
+            model = ".".join(parts[1:-1])
+            report.setdefault(model, {})[parts[-1]] = {**summary, 'histogram': latency.histogram(name)}
+        return report
@@ -0,0 +1,67 @@
+import bisect
+import threading
+from collections import defaultdict, deque
+
+# Upper bounds (seconds) of the latency histogram buckets; a final +inf bucket is implied
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+def _pick(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+class SampleRecorder:
+    """Keeps a bounded window of numeric samples per metric name"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+            self._counts[name] += 1
+
+    def percentile(self, name, pct, default=None):
+        """Return the pct-th percentile of the recent samples for name"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return default
+        return _pick(samples, pct)
+
+    def summary(self, name):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+            count = self._counts.get(name, 0)
+        if not samples:
+            return {'count': count}
+        return {
+            'count': count,
+            'avg': sum(samples) / len(samples),
+            'p50': _pick(samples, 50),
+            'p95': _pick(samples, 95),
+            'max': samples[-1],
+        }
+
+    def histogram(self, name, bounds=LATENCY_BUCKETS):
+        """Bucket counts of the recent samples as [(upper_bound, count), ...]"""
+        with self._lock:
+            samples = list(self._samples.get(name, ()))
+        bounds = tuple(bounds) + (float('inf'),)
+        counts = [0] * len(bounds)
+        for sample in samples:
+            counts[bisect.bisect_left(bounds, sample)] += 1
+        return list(zip(bounds, counts))
+
+    def snapshot(self):
+        """Summaries for every metric, keyed by name"""
+        with self._lock:
+            names = list(self._samples)
+        return {name: self.summary(name) for name in names}
+
+
+# Process-wide recorders shared by all sessions
+latency = SampleRecorder()  # seconds
+usage = SampleRecorder()  # token and payload counts
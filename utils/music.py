@@ -1,22 +1,87 @@
 from ytmusicapi import YTMusic
 from streamlit_player import st_player
 import streamlit as st
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.cache import CACHE_DIR, get_cache
+
+logger = logging.getLogger(__name__)
+
+def _song_key(text):
+    return " ".join(text.lower().split())
 
 class MusicManager:
-    def __init__(self):
+    NEXT_TRACK_COMMANDS = {"next", "next song", "the next song", "next track", "another song", "something else"}
+
+    def __init__(self, cache_path=None, prefetch_limit=10):
         self.ytmusic = YTMusic()
+        self.prefetch_limit = prefetch_limit
+        # query -> videoId, kept for 30 days and persisted between runs
+        self.cache = get_cache("music", ttl=30 * 86400, max_size=2000)
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, "music_cache.json")
+        self.cache.load(self.cache_path)
+        self._unsaved = False
+        self._lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="music-prefetch")
         
-    def search_song(self, query):
+    def new_queue(self):
+        """An empty up-next queue; each session keeps its own"""
+        return deque(maxlen=self.prefetch_limit)
+
+    def search_song(self, query, up_next=None):
+        """URL of the top result for query, queueing its related tracks into up_next"""
         try:
-            results = self.ytmusic.search(query, filter="songs")
-            if results:
-                video_id = results[0]['videoId']
+            video_id = self.cache.get_or_load(_song_key(query), lambda: self._search_video_id(query))
+            if self._unsaved:
+                self._save_cache()
+            if video_id:
+                if up_next is not None:
+                    self._prefetcher.submit(self._prefetch_related, video_id, up_next)
                 return f"https://www.youtube.com/watch?v={video_id}"
             return None
         except Exception as e:
             st.error(f"Error searching song: {str(e)}")
             return None
 
+    def _search_video_id(self, query):
+        results = self.ytmusic.search(query, filter="songs")
+        if results:
+            self._unsaved = True
+            return results[0]['videoId']
+        return None
+
+    def _prefetch_related(self, video_id, up_next):
+        """Replace up_next with the top result's related tracks"""
+        try:
+            playlist = self.ytmusic.get_watch_playlist(videoId=video_id, limit=self.prefetch_limit)
+            tracks = [t for t in playlist.get('tracks', []) if t.get('videoId') and t['videoId'] != video_id]
+            with self._lock:
+                up_next.clear()
+                for track in tracks:
+                    up_next.append(track['videoId'])
+            logger.info(f"Prefetched {len(tracks)} related tracks for {video_id}")
+        except Exception as e:
+            logger.error(f"Error prefetching related tracks: {str(e)}")
+
+    def next_song_url(self, up_next):
+        """URL of the next prefetched related track, or None if nothing is queued"""
+        with self._lock:
+            video_id = up_next.popleft() if up_next else None
+        if video_id:
+            return f"https://www.youtube.com/watch?v={video_id}"
+        return None
+
+    def _save_cache(self):
+        self._unsaved = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            self.cache.save(self.cache_path)
+        except OSError as e:
+            logger.error(f"Error saving music cache: {str(e)}")
+
     def play_music(self, url):
         try:
             st.subheader("Now Playing")
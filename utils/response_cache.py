@@ -0,0 +1,250 @@
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Words that don't change what is being asked; the context is always "now"
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "it", "its", "to", "of", "my", "me", "i", "please",
+    "hey", "veloce", "can", "you", "tell", "today", "now", "currently", "right", "like",
+    "so", "just", "do", "does", "be",
+}
+
+# Words that point back at an earlier turn ("it" is left out: "is it safe to drive?")
+FOLLOW_UP_WORDS = {
+    "that", "this", "those", "these", "they", "them", "their", "he", "she", "him", "her",
+    "his", "same", "again", "also", "instead", "else", "previous", "earlier",
+}
+FOLLOW_UP_OPENERS = {"and", "but", "so", "what about", "how about"}
+
+# Contractions typed without the apostrophe
+BARE_CONTRACTIONS = {"whats": "what", "hows": "how", "wheres": "where", "whens": "when", "thats": "that"}
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def normalize_query(text):
+    """Lowercase, drop contractions' endings, punctuation and filler words"""
+    words = []
+    for token in _TOKEN.findall(text.lower()):
+        token = BARE_CONTRACTIONS.get(token, token.split("'")[0])
+        if token and token not in STOPWORDS:
+            words.append(token)
+    return " ".join(words)
+
+def _term(token):
+    # Plurals ask the same thing; anything else (on/off, 3/4, india/indiana) doesn't
+    return token[:-1] if len(token) > 3 and token.isalpha() and token.endswith("s") else token
+
+def same_terms(query, other):
+    """Whether two normalized queries use the same words, in any order"""
+    return Counter(map(_term, query.split())) == Counter(map(_term, other.split()))
+
+def trigrams(text):
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def _bucket(value, step):
+    return None if value is None else int(float(value) // step)
+
+def response_fingerprint(vehicle=None, weather=None, city=None):
+    """Hash of the inputs an answer depends on, coarsened so small drifts don't matter"""
+    parts = []
+    if vehicle is not None:
+        parts += [vehicle.id, _bucket(vehicle.battery_level, 5), _bucket(vehicle.engine_oil_life, 5),
+                  sorted((vehicle.tire_pressure or {}).items()), _bucket(vehicle.current_mileage, 500),
+                  str(vehicle.last_service_date)]
+    if weather:
+        parts += [_bucket(weather.get('temperature'), 3), str(weather.get('description', "")).lower(),
+                  _bucket(weather.get('wind_speed'), 5)]
+    parts.append((city or "").lower())
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+def is_standalone(question):
+    """Whether question can be answered without the turns before it.
+
+    Follow-ups ("what about tomorrow?", "why is that?") and one-word
+    questions depend on the conversation, so they aren't cached.
+    """
+    words = [BARE_CONTRACTIONS.get(t, t.split("'")[0]) for t in _TOKEN.findall(question.lower())]
+    if not words or words[0] in FOLLOW_UP_OPENERS or " ".join(words[:2]) in FOLLOW_UP_OPENERS:
+        return False
+    if any(w in FOLLOW_UP_WORDS for w in words):
+        return False
+    return len(normalize_query(question).split()) >= 2
+
+class _Entry:
+    __slots__ = ("query", "grams", "fingerprint", "answer", "expires_at")
+
+    def __init__(self, query, grams, fingerprint, answer, expires_at):
+        self.query = query
+        self.grams = grams
+        self.fingerprint = fingerprint
+        self.answer = answer
+        self.expires_at = expires_at
+
+class ResponseCache:
+    """Reuses LLM answers for repeated or near-duplicate questions.
+
+    Entries are keyed by the normalized question and a fingerprint of the
+    inputs the answer was based on; callers only cache questions that
+    stand alone (see ``is_standalone``). A lookup first tries the exact
+    normalized text, then the closest earlier question by character
+    trigram Jaccard similarity, using an inverted trigram index limited to
+    the current fingerprint. A near match is only used when it has the
+    same words, up to order and plurals; trigrams just find it cheaply.
+    When a scope's fingerprint changes (the vehicle state or weather
+    moved), that scope's entries are dropped.
+    """
+
+    def __init__(self, ttl=600, threshold=0.75, max_entries=1000):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # entry id -> _Entry
+        self._exact = {}  # (fingerprint, query) -> entry id
+        self._grams = {}  # (fingerprint, trigram) -> set of entry ids
+        self._scopes = {}  # scope -> current fingerprint
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, question, fingerprint, scope=None):
+        query = normalize_query(question)
+        if not query:
+            return None
+        with self._lock:
+            self._check_scope(scope, fingerprint)
+            entry_id = self._exact.get((fingerprint, query))
+            if entry_id is not None and self._is_live(entry_id):
+                self.stats['hits'] += 1
+                return self._entries[entry_id].answer
+
+            grams = trigrams(query)
+            shared = {}
+            for gram in grams:
+                for candidate in self._grams.get((fingerprint, gram), ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            best_id, best_score = None, 0.0
+            for candidate, overlap in shared.items():
+                entry = self._entries[candidate]
+                score = overlap / (len(grams) + len(entry.grams) - overlap)
+                if score > best_score and same_terms(query, entry.query):
+                    best_id, best_score = candidate, score
+            if best_id is not None and best_score >= self.threshold and self._is_live(best_id):
+                self.stats['near_hits'] += 1
+                return self._entries[best_id].answer
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, question, fingerprint, answer, scope=None):
+        query = normalize_query(question)
+        if not query or not answer:
+            return
+        with self._lock:
+            self._check_scope(scope, fingerprint)
+            old_id = self._exact.get((fingerprint, query))
+            if old_id is not None:
+                self._remove(old_id)
+            entry_id = self._next_id
+            self._next_id += 1
+            entry = _Entry(query, trigrams(query), fingerprint, answer, time.monotonic() + self.ttl)
+            self._entries[entry_id] = entry
+            self._exact[(fingerprint, query)] = entry_id
+            for gram in entry.grams:
+                self._grams.setdefault((fingerprint, gram), set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, fingerprint=None):
+        """Drop the entries for one fingerprint, or everything"""
+        with self._lock:
+            for entry_id, entry in list(self._entries.items()):
+                if fingerprint is None or entry.fingerprint == fingerprint:
+                    self._remove(entry_id)
+
+    def _check_scope(self, scope, fingerprint):
+        if scope is None:
+            return
+        previous = self._scopes.get(scope)
+        self._scopes[scope] = fingerprint
+        if previous is not None and previous != fingerprint:
+            stale = [i for i, entry in self._entries.items() if entry.fingerprint == previous]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.stats['invalidations'] += 1
+
+    def _is_live(self, entry_id):
+        if self._entries[entry_id].expires_at > time.monotonic():
+            return True
+        self._remove(entry_id)
+        return False
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        self._exact.pop((entry.fingerprint, entry.query), None)
+        for gram in entry.grams:
+            key = (entry.fingerprint, gram)
+            ids = self._grams.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._grams[key]
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries)}
+
+
+response_cache = ResponseCache()
+
+# (first question, second question, whether the second should reuse the first's answer)
+SAMPLE_PAIRS = [
+    ("How's the weather?", "how is the weather today", True),
+    ("Is it safe to drive?", "is it safe to drive right now?", True),
+    ("What's the weather like", "whats the weather", True),
+    ("Is it safe to drive?", "Is it safe to park here?", False),
+    ("How's the weather?", "How's the traffic?", False),
+    ("What should I do if my tire is flat", "what should I do if my battery is dead", False),
+    ("Where is the nearest charging station", "where's the nearest charging stations", True),
+    ("How do I turn on cruise control", "how do I turn off cruise control", False),
+    ("What is 2 plus 3", "what is 2 plus 4", False),
+    ("What is the speed limit in India", "what is the speed limit in Indiana", False),
+]
+
+# Question -> whether it stands alone and may be cached
+SAMPLE_FOLLOW_UPS = [
+    ("Is it safe to drive?", True),
+    ("How's the weather?", True),
+    ("What about tomorrow?", False),
+    ("why is that", False),
+    ("and in Delhi?", False),
+    ("really?", False),
+    ("Tell me more", False),
+    ("Why is my battery draining so fast", True),
+]
+
+
+if __name__ == "__main__":
+    fingerprint = response_fingerprint(city="Bhubaneswar")
+    for first, second, expected in SAMPLE_PAIRS:
+        cache = ResponseCache()
+        cache.put(first, fingerprint, "answer")
+        hit = cache.get(second, fingerprint) is not None
+        flag = "ok" if hit == expected else "MISMATCH"
+        print(f"[{flag}] {first!r} -> {second!r}: {'hit' if hit else 'miss'}")
+    for question, expected in SAMPLE_FOLLOW_UPS:
+        flag = "ok" if is_standalone(question) == expected else "MISMATCH"
+        print(f"[{flag}] {question!r}: {'standalone' if expected else 'follow-up'}")
+
+    cache = ResponseCache()
+    for i in range(1000):
+        cache.put(f"question number {i} about the car", fingerprint, "answer")
+    iterations = 2000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        cache.get("question number 500 about my car", fingerprint)
+    print(f"near-duplicate lookup over 1000 entries: "
+          f"{(time.perf_counter() - start) / iterations * 1e6:.1f} us")
@@ -0,0 +1,82 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ServiceRegistry:
+    """Process-wide registry of lazily built service clients.
+
+    Services are registered as ``"module:attribute"`` targets. The module is
+    imported and the client constructed the first time ``get`` asks for it,
+    then shared by every session. Import and construction times are kept
+    per service for startup profiling.
+    """
+
+    def __init__(self):
+        self._targets = {}
+        self._instances = {}
+        self._locks = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, target, kwargs=None):
+        """Register target ("package.module:Class") built with kwargs() on first use"""
+        with self._lock:
+            self._targets[name] = (target, kwargs)
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            # Another session may have built it while we waited
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._build(name)
+                self._instances[name] = instance
+            return instance
+
+    def _build(self, name):
+        target, kwargs = self._targets[name]
+        module_name, attribute = target.split(":")
+
+        start = time.perf_counter()
+        factory = getattr(importlib.import_module(module_name), attribute)
+        imported_at = time.perf_counter()
+        instance = factory(**(kwargs() if kwargs else {}))
+        built_at = time.perf_counter()
+
+        self._timings[name] = {
+            'import_s': imported_at - start,
+            'init_s': built_at - imported_at,
+        }
+        logger.info(f"Service {name} ready: import {imported_at - start:.3f}s, "
+                    f"init {built_at - imported_at:.3f}s")
+        return instance
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def timings(self):
+        """Import and init seconds for every service built so far"""
+        return dict(self._timings)
+
+
+def _sos_kwargs():
+    from database.db_setup import get_connection_pool
+    return {'db_pool': get_connection_pool()}
+
+def _llm_kwargs():
+    return {'get_client': lambda: services.get("groq")}
+
+services = ServiceRegistry()
+services.register("audio", "utils.audio:AudioManager")
+services.register("weather", "utils.weather:WeatherService")
+services.register("groq", "groq:Groq")
+services.register("llm", "utils.llm:LLMClient", _llm_kwargs)
+services.register("music", "utils.music:MusicManager")
+services.register("sos", "utils.sos_manager:SOSManager", _sos_kwargs)
+services.register("google_search", "utils.google_search:GoogleSearchClient")
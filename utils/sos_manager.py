@@ -1,85 +1,243 @@
 import requests
-from math import radians, sin, cos, sqrt, atan2
 import logging
+import random
+import threading
+import time
+import uuid
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
 from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
 import os
+from utils.spatial_index import StationIndex, bounding_box, haversine_km
 
 logger = logging.getLogger(__name__)
 
+STATION_COLUMNS = "id, name, address, phone_number, latitude, longitude"
+
+@dataclass
+class DeliveryResult:
+    contact: str
+    phone_number: str
+    status: str  # "sent", "failed" or "pending" (still being retried in the background)
+    sid: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
 class SOSManager:
-    def __init__(self, db_connection):
-        self.conn = db_connection
-        self.twilio_client = Client(
+    def __init__(self, db_pool, use_memory_index=True, index_ttl=3600, twilio_client=None,
+                 max_workers=8, message_timeout=10, max_attempts=3, backoff=0.5, confirm_timeout=4.0):
+        """
+        Args:
+            twilio_client: Anything with Twilio's ``messages.create``/``messages.list``
+                interface. Defaults to a real client; pass a local stand-in in tests.
+            confirm_timeout: Longest the caller waits for a first delivery; sends
+                still retrying after that finish in the background.
+        """
+        self.db_pool = db_pool
+        self.use_memory_index = use_memory_index
+        self.index_ttl = index_ttl
+        self.message_timeout = message_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.confirm_timeout = confirm_timeout
+        self._station_index = None
+        self._index_loaded_at = 0.0
+        self._index_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sos")
+        self.twilio_client = twilio_client or Client(
             os.getenv('TWILIO_ACCOUNT_SID'),
-            os.getenv('TWILIO_AUTH_TOKEN')
+            os.getenv('TWILIO_AUTH_TOKEN'),
+            http_client=TwilioHttpClient(timeout=message_timeout)
         )
 
     def get_nearest_police_station(self, latitude, longitude):
-        cursor = self.conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM police_stations")
-        stations = cursor.fetchall()
-        
-        nearest = None
-        min_distance = float('inf')
-        
-        for station in stations:
-            distance = self._calculate_distance(
-                latitude, longitude,
-                float(station['latitude']), 
-                float(station['longitude'])
-            )
-            if distance < min_distance:
-                min_distance = distance
-                nearest = station
-        
-        return nearest
+        nearest = self.get_nearest_police_stations(latitude, longitude, k=1)
+        return nearest[0] if nearest else None
 
-    def _calculate_distance(self, lat1, lon1, lat2, lon2):
-        R = 6371  # Earth's radius in km
-        
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        return R * c
+    def get_nearest_police_stations(self, latitude, longitude, k=1):
+        """Return up to k stations, closest first, each with a distance_km field"""
+        latitude, longitude = float(latitude), float(longitude)
+        if self.use_memory_index:
+            matches = self._get_station_index().nearest(latitude, longitude, k)
+        else:
+            matches = self._query_nearest_stations(latitude, longitude, k)
+        return [dict(station, distance_km=round(distance, 2)) for station, distance in matches]
+
+    def _get_station_index(self):
+        """In-process grid index over all stations, reloaded every index_ttl seconds"""
+        with self._index_lock:
+            if (self._station_index is None
+                    or time.monotonic() - self._index_loaded_at > self.index_ttl):
+                with self.db_pool.connection() as conn:
+                    cursor = conn.cursor(dictionary=True)
+                    cursor.execute(f"SELECT {STATION_COLUMNS} FROM police_stations")
+                    stations = cursor.fetchall()
+                    cursor.close()
+                self._station_index = StationIndex(stations)
+                self._index_loaded_at = time.monotonic()
+                logger.info(f"Loaded {len(stations)} police stations into spatial index")
+            return self._station_index
+
+    def _query_nearest_stations(self, latitude, longitude, k, radii_km=(5, 25, 100, 500, 2000)):
+        """Nearest stations via bounding-box queries on the (latitude, longitude) index.
+
+        The box grows until it holds k stations within its inscribed radius,
+        which guarantees nothing outside the box is closer.
+        """
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                for radius in radii_km:
+                    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius)
+                    if min_lon < -180 or max_lon > 180:
+                        # Box crosses the antimeridian; fall back to a full scan
+                        break
+                    cursor.execute(
+                        f"SELECT {STATION_COLUMNS} FROM police_stations "
+                        "WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s",
+                        (min_lat, max_lat, min_lon, max_lon)
+                    )
+                    matches = self._rank_stations(latitude, longitude, cursor.fetchall())
+                    within = [match for match in matches if match[1] <= radius]
+                    if len(within) >= k:
+                        return within[:k]
+
+                cursor.execute(f"SELECT {STATION_COLUMNS} FROM police_stations")
+                return self._rank_stations(latitude, longitude, cursor.fetchall())[:k]
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def _rank_stations(latitude, longitude, stations):
+        if not stations:
+            return []
+        distances = haversine_km(
+            latitude, longitude,
+            np.array([float(s['latitude']) for s in stations]),
+            np.array([float(s['longitude']) for s in stations])
+        )
+        return [(stations[i], float(distances[i])) for i in np.argsort(distances)]
 
     def send_sos_messages(self, location, situation="Emergency! Need immediate assistance!"):
-        cursor = self.conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM emergency_contacts")
-        contacts = cursor.fetchall()
+        deliveries = self.dispatch_sos_messages(location, situation)
+        return sum(1 for delivery in deliveries if delivery.status == "sent")
+
+    def dispatch_sos_messages(self, location, situation=None):
+        """Send the SOS to every emergency contact concurrently.
+
+        Returns one DeliveryResult per contact as soon as one message is
+        sent, or after ``confirm_timeout`` seconds. Each send has its own
+        deadline and is retried with backoff on transient Twilio errors;
+        sends still going when this returns are reported as "pending" and
+        carry on in the background.
+        """
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM emergency_contacts")
+            contacts = cursor.fetchall()
+            cursor.close()
         
+        alert_id = uuid.uuid4().hex[:8]
         message_body = (
             f"EMERGENCY SOS ALERT!\n"
-            f"Situation: {situation}\n"
+            f"Situation: {situation or 'Emergency! Need immediate assistance!'}\n"
             f"Location: {location}\n"
-            f"Google Maps Link: https://www.google.com/maps?q={location}"
+            f"Google Maps Link: https://www.google.com/maps?q={location}\n"
+            f"Alert ID: {alert_id}"
         )
         
-        sent_count = 0
-        for contact in contacts:
+        futures = {
+            self._executor.submit(self._send_with_retry, contact, message_body): contact
+            for contact in contacts
+        }
+        # The driver is waiting on this: stop at the first confirmed send
+        deadline_at = time.monotonic() + self.confirm_timeout
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done or any(future.result().status == "sent" for future in done):
+                break
+
+        deliveries = []
+        for future, contact in futures.items():
+            if future.done():
+                deliveries.append(future.result())
+            else:
+                logger.warning(f"SOS to {contact['name']} still sending in the background")
+                deliveries.append(DeliveryResult(contact['name'], contact['phone_number'], "pending"))
+        return deliveries
+
+    def _send_with_retry(self, contact, message_body):
+        started_at = datetime.now(timezone.utc)
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
             try:
                 message = self.twilio_client.messages.create(
                     body=message_body,
                     from_=os.getenv('TWILIO_PHONE_NUMBER'),
                     to=contact['phone_number']
                 )
-                sent_count += 1
                 logger.info(f"SOS message sent to {contact['name']}")
+                return DeliveryResult(contact['name'], contact['phone_number'], "sent",
+                                      sid=getattr(message, 'sid', None), attempts=attempt)
+            except TwilioRestException as e:
+                error = e
+                # 4xx (bad number, unverified recipient, ...) will not succeed on retry
+                if e.status != 429 and e.status < 500:
+                    break
+            except requests.exceptions.ConnectTimeout as e:
+                # Never reached Twilio, safe to resend
+                error = e
+            except requests.exceptions.RequestException as e:
+                error = e
+                # The request may have been accepted before the connection dropped;
+                # look for it before sending again so contacts don't get duplicates
+                sid = self._find_sent_message(contact['phone_number'], message_body, started_at)
+                if sid:
+                    logger.info(f"SOS message to {contact['name']} was delivered despite {type(e).__name__}")
+                    return DeliveryResult(contact['name'], contact['phone_number'], "sent",
+                                          sid=sid, attempts=attempt)
             except Exception as e:
-                logger.error(f"Failed to send SOS to {contact['name']}: {str(e)}")
-        
-        return sent_count
+                error = e
+                break
+
+            if attempt < self.max_attempts:
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(1.0, 1.5)
+                logger.warning(f"Retrying SOS to {contact['name']} in {delay:.2f}s: {str(error)}")
+                time.sleep(delay)
+
+        logger.error(f"Failed to send SOS to {contact['name']}: {str(error)}")
+        return DeliveryResult(contact['name'], contact['phone_number'], "failed",
+                              attempts=attempt, error=str(error))
+
+    def _find_sent_message(self, phone_number, message_body, since):
+        try:
+            for message in self.twilio_client.messages.list(
+                    to=phone_number, date_sent_after=since, limit=20):
+                if message.body == message_body:
+                    return message.sid
+        except Exception as e:
+            logger.error(f"Could not check for earlier SOS delivery: {str(e)}")
+        return None
 
     def handle_sos_request(self, latitude, longitude, situation=None):
         location = f"{latitude},{longitude}"
-        nearest_station = self.get_nearest_police_station(latitude, longitude)
-        messages_sent = self.send_sos_messages(location, situation)
+        # Look up the station while the messages go out
+        station_future = self._executor.submit(self.get_nearest_police_station, latitude, longitude)
+        deliveries = self.dispatch_sos_messages(location, situation)
+        nearest_station = station_future.result()
         
         return {
             "status": "success",
-            "messages_sent": messages_sent,
+            "messages_sent": sum(1 for delivery in deliveries if delivery.status == "sent"),
+            "messages_pending": sum(1 for delivery in deliveries if delivery.status == "pending"),
+            "deliveries": deliveries,
             "nearest_police_station": nearest_station,
             "location": location
         }
\ No newline at end of file
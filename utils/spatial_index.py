@@ -0,0 +1,183 @@
+import math
+import random
+import time
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def haversine_km(lat, lon, lats, lons):
+    """Vectorized great-circle distance from one point to arrays of points"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing a circle of radius_km"""
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-6:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+class StationIndex:
+    """Uniform latitude/longitude grid over station rows for k-nearest lookups.
+
+    Rows only need ``latitude`` and ``longitude`` keys. A query scans grid
+    rings outward from the query cell, computes haversine distances for the
+    candidates in one NumPy call, and stops once the k-th best distance is
+    closer than anything outside the scanned rings could be. Longitude
+    columns wrap around at the antimeridian.
+    """
+
+    def __init__(self, rows, cell_deg=0.5):
+        self.rows = list(rows)
+        self.cell_deg = cell_deg
+        self.n_cols = max(1, round(360 / cell_deg))
+        self.lats = np.array([float(r['latitude']) for r in self.rows], dtype=np.float64)
+        self.lons = np.array([float(r['longitude']) for r in self.rows], dtype=np.float64)
+
+        cells = {}
+        if self.rows:
+            keys = zip(np.floor(self.lats / cell_deg).astype(int),
+                       np.floor(self.lons / cell_deg).astype(int) % self.n_cols)
+            for index, key in enumerate(keys):
+                cells.setdefault(key, []).append(index)
+        self.cells = {key: np.array(indices) for key, indices in cells.items()}
+        if self.cells:
+            cell_rows, cell_cols = zip(*self.cells)
+            self._row_extent = (min(cell_rows), max(cell_rows))
+            self._occupied_cols = np.unique(np.array(cell_cols))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def nearest(self, lat, lon, k=1):
+        """Return up to k (row, distance_km) pairs, closest first"""
+        if not self.rows:
+            return []
+        k = min(k, len(self.rows))
+        ci = math.floor(lat / self.cell_deg)
+        cj = math.floor(lon / self.cell_deg) % self.n_cols
+        covering_ring = self._covering_ring(ci, cj)
+
+        found = []
+        ring = 0
+        while True:
+            for key in self._ring_cells(ci, cj, ring):
+                indices = self.cells.get(key)
+                if indices is not None:
+                    found.append(indices)
+
+            if ring >= covering_ring:
+                break
+            candidates = np.concatenate(found) if found else None
+            if candidates is not None and len(candidates) >= k:
+                distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+                kth = np.partition(distances, k - 1)[k - 1]
+                if kth <= self._unscanned_bound_km(lat, lon, ci, cj, ring):
+                    return self._top_k(candidates, distances, k)
+            ring += 1
+
+        candidates = np.concatenate(found)
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        return self._top_k(candidates, distances, k)
+
+    def _top_k(self, candidates, distances, k):
+        order = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        order = order[np.argsort(distances[order])]
+        return [(self.rows[candidates[i]], float(distances[i])) for i in order]
+
+    def _covering_ring(self, ci, cj):
+        """Smallest ring around (ci, cj) that reaches every occupied cell"""
+        min_i, max_i = self._row_extent
+        col_offsets = np.abs(self._occupied_cols - cj)
+        col_offsets = np.minimum(col_offsets, self.n_cols - col_offsets)
+        return max(ci - min_i, max_i - ci, int(col_offsets.max()))
+
+    def _ring_cells(self, ci, cj, ring):
+        """Occupied-row cells at Chebyshev distance ring, each column once"""
+        n = self.n_cols
+        min_i, max_i = self._row_extent
+        if ring == 0:
+            yield (ci, cj)
+            return
+        # Once the ring is wider than the globe its sides wrap onto columns
+        # an inner ring already covered
+        cols = range(max(-ring, -(n // 2)), min(ring, n - n // 2 - 1) + 1)
+        for i in (ci - ring, ci + ring):
+            if min_i <= i <= max_i:
+                for dj in cols:
+                    yield (i, (cj + dj) % n)
+        sides = [dj for dj in (-ring, ring) if abs(dj) <= n // 2]
+        if len(sides) == 2 and 2 * ring == n:
+            sides.pop()
+        for i in range(max(ci - ring + 1, min_i), min(ci + ring - 1, max_i) + 1):
+            for dj in sides:
+                yield (i, (cj + dj) % n)
+
+    def _unscanned_bound_km(self, lat, lon, ci, cj, ring):
+        """Lower bound on the distance to any point outside the scanned rings"""
+        lat_lo = (ci - ring) * self.cell_deg
+        lat_hi = (ci + ring + 1) * self.cell_deg
+        lat_margin = min(lat - lat_lo, lat_hi - lat) * KM_PER_DEGREE
+        if 2 * ring + 1 >= self.n_cols:
+            # Every longitude has been scanned
+            return lat_margin * 0.99
+        lon = lon % 360
+        lon_margin = min(lon - (cj - ring) * self.cell_deg, (cj + ring + 1) * self.cell_deg - lon)
+        # Distance to the nearest unscanned meridian, or to the pole it passes through
+        to_meridian = math.asin(math.sin(math.radians(min(90.0, lon_margin))) * math.cos(math.radians(lat)))
+        to_pole = math.radians(90.0 - abs(lat))
+        return min(lat_margin, EARTH_RADIUS_KM * min(to_meridian, to_pole)) * 0.99
+
+def benchmark(n=100000, queries=200, k=5, seed=7):
+    """Compare index build and query cost with a brute-force scan over n stations"""
+    from math import radians, sin, cos, sqrt, atan2
+
+    rng = random.Random(seed)
+    # Roughly the extent of India
+    rows = [{'id': i, 'latitude': rng.uniform(8, 35), 'longitude': rng.uniform(68, 97)}
+            for i in range(n)]
+    points = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(queries)]
+
+    def brute_force(lat, lon):
+        best, best_distance = None, float('inf')
+        for row in rows:
+            lat1, lon1, lat2, lon2 = map(radians, [lat, lon, row['latitude'], row['longitude']])
+            a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+            distance = EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1 - a))
+            if distance < best_distance:
+                best, best_distance = row, distance
+        return best
+
+    start = time.perf_counter()
+    index = StationIndex(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    results = [index.nearest(lat, lon, k=k) for lat, lon in points]
+    index_ms = (time.perf_counter() - start) * 1000 / queries
+
+    sample = points[:10]
+    start = time.perf_counter()
+    expected = [brute_force(lat, lon) for lat, lon in sample]
+    brute_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    mismatches = sum(1 for got, want in zip(results, expected) if got[0][0]['id'] != want['id'])
+    return {
+        'stations': n,
+        'build_ms': build_ms,
+        'index_query_ms': index_ms,
+        'brute_force_query_ms': brute_ms,
+        'mismatches': mismatches,
+    }
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
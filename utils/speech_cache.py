@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class SpeechCache:
+    """On-disk cache of synthesized speech.
+
+    Entries are content addressed: the file name is a hash of the voice,
+    model and text, so the same phrase spoken by the same voice is only
+    synthesized once. Audio is stored as the compressed MP3 returned by the
+    TTS API. When the directory grows past ``max_bytes`` the least recently
+    used files are removed.
+    """
+
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024, extension="mp3"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._entries = {}  # key -> [size, last_used]
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def make_key(text, voice, model):
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{voice}\0{model}\0{normalized}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.{self.extension}")
+
+    def _scan(self):
+        """Index the files left by previous runs"""
+        suffix = f".{self.extension}"
+        for name in os.listdir(self.directory):
+            if not name.endswith(suffix):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            self._entries[name[:-len(suffix)]] = [info.st_size, info.st_mtime]
+            self._total_bytes += info.st_size
+        self._evict()
+
+    def get(self, text, voice, model):
+        key = self.make_key(text, voice, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            entry[1] = time.time()
+        try:
+            with open(self._path(key), 'rb') as f:
+                audio = f.read()
+            os.utime(self._path(key))  # mtime is the LRU clock across restarts
+        except OSError:
+            with self._lock:
+                self._drop(key)
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return audio
+
+    def put(self, text, voice, model, audio):
+        key = self.make_key(text, voice, model)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing speech cache entry: {str(e)}")
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = [len(audio), time.time()]
+            self._total_bytes += len(audio)
+            self._evict()
+
+    def contains(self, text, voice, model):
+        with self._lock:
+            return self.make_key(text, voice, model) in self._entries
+
+    def get_or_synthesize(self, text, voice, model, synthesize):
+        audio = self.get(text, voice, model)
+        if audio is None:
+            audio = synthesize(text)
+            self.put(text, voice, model, audio)
+        return audio
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total_bytes -= entry[0]
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._drop(key)
+            self.stats['evictions'] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'bytes': self._total_bytes}
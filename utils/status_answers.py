@@ -0,0 +1,157 @@
+import re
+import time
+from datetime import date, datetime
+from types import SimpleNamespace
+
+# Words that put a query on a status topic
+TOPIC_WORDS = {
+    "battery": "battery", "charge": "battery", "charged": "battery", "soc": "battery",
+    "tire": "tires", "tires": "tires", "tyre": "tires", "tyres": "tires",
+    "oil": "oil",
+    "mileage": "mileage", "odometer": "mileage", "miles": "mileage",
+    "kilometers": "kilometers", "kilometres": "kilometers", "km": "kilometers",
+    "service": "service", "serviced": "service", "maintenance": "service",
+}
+
+# Mean tire pressure only on their own or next to a tire word: "oil pressure" isn't one
+PRESSURE_WORDS = {"pressure", "pressures", "psi"}
+
+# "when is my service" asks for the next one; only these make it about the last
+PAST_SERVICE_WORDS = {"was", "last", "did", "had"}
+
+KM_PER_MILE = 1.609344
+
+# Everything else a status query may contain. Any other word (e.g. "should",
+# "improve", "range", "replace") means the driver wants more than a reading.
+FILLER_WORDS = set("""
+    a all am an and any are at be can check current currently did do does doing
+    engine for from give had has have hey how i i'm is it it's its last latest left
+    level levels life me much my now of on please read reading remaining right
+    show so state status tell the there they this to today was what what's whats
+    when where which with you your
+    car vehicle
+""".split())
+
+# Together these ask for a value rather than state a fact or request an action
+QUESTION_WORDS = {"what", "what's", "whats", "how", "check", "show", "tell", "give",
+                  "when", "status", "level", "levels", "reading"}
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+TIRE_POSITIONS = (("FL", "front left"), ("FR", "front right"), ("RL", "rear left"), ("RR", "rear right"))
+
+def _number(value):
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+def _format_date(value):
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%Y-%m-%d").date()
+    return f"{value:%B} {value.day}, {value.year}"
+
+def _battery(vehicle):
+    if vehicle.battery_level is None:
+        return f"Battery level isn't reported for your {vehicle.model}."
+    return f"Your battery is at {_number(vehicle.battery_level)}%."
+
+def _tires(vehicle):
+    pressure = vehicle.tire_pressure or {}
+    readings = [f"{label} {_number(pressure[key])} PSI" for key, label in TIRE_POSITIONS if key in pressure]
+    if not readings:
+        return "Tire pressure readings aren't available right now."
+    return f"Tire pressure: {', '.join(readings)}."
+
+def _oil(vehicle):
+    if vehicle.engine_oil_life is None:
+        return "Engine oil life isn't available right now."
+    return f"Engine oil life is at {_number(vehicle.engine_oil_life)}%."
+
+def _mileage(vehicle):
+    if vehicle.current_mileage is None:
+        return "Mileage isn't available right now."
+    return f"Your {vehicle.model} has {vehicle.current_mileage:,.0f} miles on it."
+
+def _kilometers(vehicle):
+    if vehicle.current_mileage is None:
+        return "Mileage isn't available right now."
+    return f"Your {vehicle.model} has {vehicle.current_mileage * KM_PER_MILE:,.0f} km on it."
+
+def _service(vehicle):
+    if not vehicle.last_service_date:
+        return "I don't have a service date on record for this vehicle."
+    return f"Your last service was on {_format_date(vehicle.last_service_date)}."
+
+ANSWERS = {"battery": _battery, "tires": _tires, "oil": _oil, "mileage": _mileage,
+           "kilometers": _kilometers, "service": _service}
+
+def answer_status_query(text, vehicle):
+    """Answer a plain vehicle status question from the loaded Vehicle.
+
+    Returns None unless every word of text is a status topic or filler and
+    the text asks for a value, so advice questions ("should I replace my
+    tires?") still go to the LLM. So do readings the vehicle doesn't report
+    ("oil pressure") and questions about the next service.
+    """
+    if vehicle is None:
+        return None
+    tokens = _TOKEN.findall(text.lower())
+    topics = []
+    pressure = False
+    for token in tokens:
+        topic = TOPIC_WORDS.get(token)
+        if topic is not None:
+            if topic not in topics:
+                topics.append(topic)
+        elif token in PRESSURE_WORDS:
+            pressure = True
+        elif token not in FILLER_WORDS:
+            return None
+    if pressure and "tires" not in topics:
+        if topics:
+            return None
+        topics.append("tires")
+    if not topics or not QUESTION_WORDS.intersection(tokens):
+        return None
+    if "service" in topics and "when" in tokens and not PAST_SERVICE_WORDS.intersection(tokens):
+        return None
+    return " ".join(ANSWERS[topic](vehicle) for topic in topics)
+
+
+SAMPLE_VEHICLE = SimpleNamespace(
+    id=1, model="ID.4", year=2024, vin="WVGZZZE2ZMP123456", current_mileage=15000.5,
+    battery_level=85.5, tire_pressure={"FL": 32, "FR": 32, "RL": 32, "RR": 32},
+    engine_oil_life=75.0, last_service_date=date(2024, 1, 15),
+)
+
+# Utterance -> whether the fast path should answer it
+SAMPLE_QUERIES = [
+    ("what's my battery level", True),
+    ("check tire pressure", True),
+    ("how much charge do I have left", True),
+    ("what is the engine oil life", True),
+    ("what's the current mileage", True),
+    ("when was my last service", True),
+    ("check battery and tire pressure", True),
+    ("what's the pressure", True),
+    ("what are my kilometers", True),
+    ("what is the oil pressure", False),
+    ("when is my service", False),
+    ("should I replace my tires", False),
+    ("how can I improve my battery range", False),
+    ("is it safe to drive with low tire pressure", False),
+    ("start the engine", False),
+    ("what's the weather like", False),
+]
+
+
+if __name__ == "__main__":
+    for query, expected in SAMPLE_QUERIES:
+        answer = answer_status_query(query, SAMPLE_VEHICLE)
+        flag = "ok" if (answer is not None) == expected else "MISMATCH"
+        print(f"[{flag}] {query!r}: {answer}")
+    iterations = 20000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for query, _ in SAMPLE_QUERIES:
+            answer_status_query(query, SAMPLE_VEHICLE)
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed / (iterations * len(SAMPLE_QUERIES)) * 1e6:.2f} us/query")
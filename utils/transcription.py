@@ -0,0 +1,220 @@
+import logging
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.metrics import latency
+
+logger = logging.getLogger(__name__)
+
+# Longest run of words looked for when lining up overlapping chunks
+MAX_OVERLAP_WORDS = 12
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+def stitch(words, new_words, max_overlap=MAX_OVERLAP_WORDS):
+    """Append new_words to words, dropping the part both chunks heard.
+
+    Consecutive chunks share ``overlap_seconds`` of audio, so the start of
+    the new transcript normally repeats the end of the previous one. The
+    longest matching run wins. A word cut at a chunk boundary may come back
+    as a fragment, so the last old word and the first new word are each
+    allowed to differ from their counterpart.
+    """
+    if not words:
+        return list(new_words)
+    old = [_normalize_word(w) for w in words[-(max_overlap + 1):]]
+    new = [_normalize_word(w) for w in new_words[:max_overlap + 1]]
+    best = None
+    for size in range(min(len(old), len(new), max_overlap), 0, -1):
+        for drop_old in (0, 1):
+            for skip_new in (0, 1):
+                end = len(old) - drop_old
+                if end - size < 0 or skip_new + size > len(new):
+                    continue
+                # A single matching word is only trusted if nothing is skipped,
+                # or the dropped fragment is the start of the next new word
+                if size == 1 and (drop_old or skip_new):
+                    following = new[skip_new + 1] if skip_new + 1 < len(new) else ""
+                    if skip_new or not (old[-1] and following.startswith(old[-1])):
+                        continue
+                if old[end - size:end] == new[skip_new:skip_new + size]:
+                    best = (drop_old, skip_new + size)
+                    break
+            if best:
+                break
+        if best:
+            break
+    if best is None:
+        return list(words) + list(new_words)
+    drop_old, consumed = best
+    return list(words[:len(words) - drop_old]) + list(new_words[consumed:])
+
+
+class StreamingTranscriber:
+    """Transcribes a recording in overlapping chunks while it is captured.
+
+    Feed microphone frames as they arrive. Every ``chunk_seconds`` of audio
+    a chunk, extended back by ``overlap_seconds``, is sent to ``transcribe``
+    on a background worker, and the partial transcripts are stitched on
+    their shared words. ``finish`` only has to transcribe the tail after the
+    last chunk, so the final text is ready shortly after speech ends. A
+    chunk that fails is retried once; if it fails again the partial text is
+    abandoned and ``finish`` transcribes the whole recording in one call.
+
+    ``transcribe(samples, sample_rate)`` returns text. ``on_partial`` is
+    called with the stitched text from the thread calling ``feed``.
+    """
+
+    def __init__(self, transcribe, sample_rate, chunk_seconds=4.0, overlap_seconds=1.0, on_partial=None):
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self.chunk_size = int(chunk_seconds * sample_rate)
+        self.overlap = int(overlap_seconds * sample_rate)
+        self.on_partial = on_partial
+        self._frames = []
+        self._samples = 0
+        self._chunk_start = 0
+        self._pending = deque()  # (future, chunk, retried)
+        self._failed = False
+        self._words = []
+        # One worker keeps chunks in order; transcription is faster than speech
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcribe")
+
+    @property
+    def text(self):
+        return " ".join(self._words)
+
+    def feed(self, frame):
+        self._frames.append(frame)
+        self._samples += len(frame)
+        if self._samples - self._chunk_start >= self.chunk_size:
+            self._submit(self._samples)
+        self._collect(wait=False)
+
+    def _submit(self, end):
+        audio = np.concatenate(self._frames)
+        self._frames = [audio]
+        start = max(0, self._chunk_start - self.overlap)
+        chunk = audio[start:end]
+        if not self._failed:
+            self._pending.append((self._executor.submit(self.transcribe, chunk, self.sample_rate), chunk, False))
+        self._chunk_start = end
+
+    def _collect(self, wait):
+        updated = False
+        while self._pending and (wait or self._pending[0][0].done()):
+            future, chunk, retried = self._pending.popleft()
+            try:
+                words = (future.result() or "").split()
+            except Exception as e:
+                if retried:
+                    logger.error(f"Error transcribing audio chunk again, falling back to the full recording: {str(e)}")
+                    self._give_up()
+                    return
+                logger.warning(f"Error transcribing audio chunk, retrying: {str(e)}")
+                # Back at the front so the chunks are still stitched in order
+                self._pending.appendleft((self._executor.submit(self.transcribe, chunk, self.sample_rate),
+                                          chunk, True))
+                continue
+            self._words = stitch(self._words, words)
+            updated = True
+        if updated and self.on_partial:
+            self.on_partial(self.text)
+
+    def _give_up(self):
+        self._failed = True
+        for future, _, _ in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    def finish(self):
+        """Transcribe the remaining audio and return the full transcript"""
+        started_at = time.perf_counter()
+        if self._samples > self._chunk_start:
+            self._submit(self._samples)
+        self._collect(wait=True)
+        self._executor.shutdown(wait=False)
+        if self._failed:
+            # A transcript with a hole in it is worse than waiting for one full pass
+            self._words = (self.transcribe(np.concatenate(self._frames), self.sample_rate) or "").split()
+        latency.observe("stt.final", time.perf_counter() - started_at)
+        return self.text
+
+    def cancel(self):
+        self._give_up()
+        self._executor.shutdown(wait=False)
+
+
+class StandInTranscriber:
+    """Local stand-in for the Whisper API used by the benchmark.
+
+    The synthetic audio stores a word index in every sample, so the
+    transcript of any slice is known exactly: a word is heard when at least
+    half of it falls inside the slice. Latency grows with audio length like
+    a real API call.
+    """
+
+    def __init__(self, words, sample_rate=16000, word_seconds=0.4,
+                 base_latency=0.3, seconds_per_audio_second=0.05, speed=1.0):
+        self.words = words
+        self.sample_rate = sample_rate
+        self.word_samples = int(word_seconds * sample_rate)
+        self.base_latency = base_latency
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.speed = speed
+
+    def audio(self):
+        return np.repeat(np.arange(1, len(self.words) + 1, dtype=np.int16), self.word_samples).reshape(-1, 1)
+
+    def __call__(self, samples, sample_rate):
+        duration = len(samples) / sample_rate
+        time.sleep((self.base_latency + self.seconds_per_audio_second * duration) * self.speed)
+        counts = np.bincount(samples.ravel(), minlength=len(self.words) + 1)
+        return " ".join(word for i, word in enumerate(self.words, start=1)
+                        if counts[i] >= self.word_samples / 2)
+
+
+def benchmark(seconds=12.0, speed=0.1, frame_ms=30, sample_rate=16000):
+    """Compare time-to-transcript after speech ends, batch vs streaming.
+
+    Speech is replayed ``1 / speed`` times faster than real time and the
+    stand-in latencies are scaled to match; reported numbers are unscaled.
+    """
+    word_seconds = 0.4
+    script = [f"word{i}" for i in range(int(seconds / word_seconds))]
+    stand_in = StandInTranscriber(script, sample_rate, word_seconds, speed=speed)
+    audio = stand_in.audio()
+    frame_size = int(sample_rate * frame_ms / 1000)
+    frames = [audio[i:i + frame_size] for i in range(0, len(audio), frame_size)]
+
+    def replay(on_frame):
+        for frame in frames:
+            time.sleep(frame_ms / 1000 * speed)
+            on_frame(frame)
+
+    recorded = []
+    replay(recorded.append)
+    started_at = time.perf_counter()
+    batch_text = stand_in(np.concatenate(recorded), sample_rate)
+    batch_wait = (time.perf_counter() - started_at) / speed
+
+    partials = []
+    transcriber = StreamingTranscriber(stand_in, sample_rate, on_partial=partials.append)
+    replay(transcriber.feed)
+    started_at = time.perf_counter()
+    streaming_text = transcriber.finish()
+    streaming_wait = (time.perf_counter() - started_at) / speed
+
+    expected = " ".join(script)
+    print(f"{seconds:.0f}s utterance, {len(script)} words")
+    print(f"batch:     {batch_wait * 1000:7.0f} ms after speech ends, exact={batch_text == expected}")
+    print(f"streaming: {streaming_wait * 1000:7.0f} ms after speech ends, exact={streaming_text == expected}, "
+          f"{len(partials)} interim updates")
+
+
+if __name__ == "__main__":
+    for seconds in (3.0, 8.0, 15.0):
+        benchmark(seconds)
@@ -3,6 +3,26 @@ import logging
 import streamlit as st
 
 class VehicleController:
+    # Every reply the controller can give, spoken often enough to keep pre-synthesized
+    RESPONSES = (
+        "Vehicle lights are already on",
+        "Vehicle lights have been turned on",
+        "Vehicle lights are already off",
+        "Vehicle lights have been turned off",
+        "Invalid lights command",
+        "All doors are already locked",
+        "All doors have been locked",
+        "All doors are already unlocked",
+        "All doors have been unlocked",
+        "Invalid door command",
+        "Engine is already running",
+        "Please lock the doors before starting the engine",
+        "Engine has been started",
+        "Engine is already stopped",
+        "Engine has been stopped",
+        "Invalid engine command",
+    )
+
     def __init__(self):
         self.lights_on = False
         self.doors_locked = False
@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 import logging
 from typing import Optional, Dict, Union
+from utils.cache import get_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +17,7 @@ class WeatherService:
         if not self.api_key:
             raise ValueError("OPENWEATHERMAP_API_KEY not found in environment variables")
         self.base_url = "http://api.openweathermap.org/data/2.5/weather"
+        self.cache = get_cache("weather", ttl=600, max_size=256, stale_ttl=3600)
 
     def get_weather(self, city: str) -> Optional[Dict[str, Union[float, str]]]:
         """
@@ -31,6 +33,10 @@ class WeatherService:
             logger.error("Invalid city parameter")
             return None
 
+        return self.cache.get_or_load(city.strip().lower(), lambda: self._fetch_weather(city))
+
+    def _fetch_weather(self, city: str) -> Optional[Dict[str, Union[float, str]]]:
+        """Fetch current weather for a city from OpenWeatherMap"""
         params = {
             'q': city,
             'appid': self.api_key,